@@ -1,7 +1,9 @@
 from .utils.downloader.text_downloader import BlogDownloader
 from .utils.AI.textAI import TextAI
+from .utils.AI.json_stream import assemble
 from .utils.AI.imageAI import ImageAI
-from .utils.AI.prompt.text_prompt import GENERATE_BLOG_FROM_BLOG
+from .utils.AI.output_parser import OutputParser, token_budget
+from .utils.AI.prompt.text_prompt import GENERATE_BLOG_FROM_BLOG, REPAIR_JSON
 from .utils.AI.syntax.blog_syntax import HUGO
 from .utils.converter.blog_converter import BlogConverter
 from .utils.converter.image_converter import ImageConverter
@@ -15,7 +17,13 @@ class BlogGenerator:
     Class responsible for generating blogs.
     """
 
-    def __init__(self, model_id=None, prompt=GENERATE_BLOG_FROM_BLOG, syntax=HUGO):
+    def __init__(
+        self,
+        model_id=None,
+        prompt=GENERATE_BLOG_FROM_BLOG,
+        syntax=HUGO,
+        use_cache=False,
+    ):
         """
         Initialize the BlogGenerator class.
 
@@ -23,7 +31,9 @@ class BlogGenerator:
             model_id (str, optional): The ID of the text AI model to use. Defaults to None.
             prompt (str, optional): The prompt template for generating the blog. Defaults to GENERATE_BLOG_FROM_BLOG.
             syntax (str, optional): The syntax to use for the generated blog. Defaults to HUGO.
+            use_cache (bool, optional): Whether identical blog prompts reuse the cached response. Defaults to False.
         """
+        self.use_cache = use_cache
 
         self.model_id = model_id
         self.prompt = prompt
@@ -35,6 +45,7 @@ class BlogGenerator:
         summary: bool = False,
         instructions: str = "",
         is_topic: bool = False,
+        on_field=None,
     ) -> str:
         """
         Generate text for the blog.
@@ -44,6 +55,9 @@ class BlogGenerator:
             summary (bool, optional): Whether to include a summary in the generated blog. Defaults to False.
             instructions (str, optional): Additional instructions for the text AI model. Defaults to "".
             is_topic (bool, optional): Whether the input URL is a topic or a blog. Defaults to False.
+            on_field (callable, optional): When given, the blog is streamed and on_field is called
+                with (path, value) for each field as soon as it is complete, e.g. (("title",), title)
+                or (("content", 0), {"heading": ..., "image": ..., "content": ...}). Defaults to None.
 
         Returns:
             str: The generated blog text.
@@ -57,26 +71,37 @@ class BlogGenerator:
             else:
                 blog = url
             if self.model_id is None:
-                text_ai = TextAI()
+                text_ai = TextAI(use_cache=self.use_cache)
             else:
-                text_ai = TextAI(model_id=self.model_id)
-            blog_text = text_ai.predict(
+                text_ai = TextAI(model_id=self.model_id, use_cache=self.use_cache)
+            parser = OutputParser(self.syntax)
+            # section contents are much longer than the other fields
+            max_tokens = token_budget(self.syntax, field_tokens={"content": 192})
+            predict = text_ai.predict
+            if on_field is not None:
+                predict = lambda **kwargs: assemble(text_ai.stream(**kwargs), on_field)
+            blog_text = predict(
                 prompt_template=self.prompt,
                 topic=blog,
                 instructions=instructions,
                 syntax=self.syntax,
                 date=date.today().strftime("%B %d, %Y"),
+                max_tokens=max_tokens,
+                until=parser.complete,
+                cache_if=parser.accepts,
             )
 
-            try:
-                blog_text = blog_text.replace("```json", "")
-                blog_text = blog_text.replace("```", "")
-            except Exception as e:
-                raise Exception(
-                    "Error occurred while removing json code block: " + str(e)
-                )
-
-            return json.loads(blog_text)
+            return parser.parse(
+                blog_text,
+                repair=lambda text, error: text_ai.predict(
+                    REPAIR_JSON,
+                    text=text,
+                    error=error,
+                    syntax=self.syntax,
+                    max_tokens=max_tokens,
+                    cache_if=parser.accepts,
+                ),
+            )
 
         except Exception as e:
             # Handle the exception here
@@ -88,14 +113,18 @@ class BlogGenerator:
         prompts: list,
         image_path: str = "images",
         infrence_params: dict = None,
+        max_workers: int = 4,
+        timeout: float = 120,
     ) -> bool:
         """
-        Generate images for the blog.
+        Generate images for the blog, several at a time.
 
         Args:
             prompts (list): List of prompts for generating images.
             image_path (str, optional): The path to save the generated images. Defaults to "images".
             infrence_params (dict, optional): Inference parameters for generating images. Defaults to None.
+            max_workers (int, optional): Number of images generated at the same time. Defaults to 4.
+            timeout (float, optional): Seconds after which an image request is given up. Defaults to 120.
 
         Returns:
             bool: True if images are generated successfully, False otherwise.
@@ -108,19 +137,19 @@ class BlogGenerator:
                     "quality": "standard",
                     "size": "1024x1024",
                 }
-            for i, prompt in enumerate(prompts):
-                image_ai = ImageAI()
-                path = os.path.join(image_path, f"{i}.png")
-                path = os.path.abspath(path)
-
-                image_ai.generate(
-                    prompt=prompt,
-                    inference_params=infrence_params,
-                    output_file=path,
-                )
-
+            image_ai = ImageAI()
+            results = image_ai.generate_batch(
+                prompts,
+                image_path,
+                inference_params=infrence_params,
+                max_workers=max_workers,
+                timeout=timeout,
+            )
+            for result in results:
+                if not result["ok"]:
+                    continue
                 try:
-                    image_converter.resize([path])
+                    image_converter.resize([result["output_file"]])
                 except Exception as e:
                     print(f"Error resizing image: {e}")
                     continue
@@ -187,6 +216,7 @@ class BlogGenerator:
         debug: bool = False,
         base_dir: str = "./",
         is_topic: bool = False,
+        on_field=None,
     ) -> dict:
         """
         Generate the complete blog.
@@ -200,6 +230,8 @@ class BlogGenerator:
             debug (bool, optional): Whether to print debug information. Defaults to False.
             base_dir (str, optional): The base directory to save the generated blog. Defaults to "./".
             is_topic (bool, optional): Whether the input URL is a topic or a blog. Defaults to False.
+            on_field (callable, optional): Called with each field of the blog text as soon as it
+                is complete, see generate_text. Defaults to None.
 
         Returns:
             dict: The generated blog data.
@@ -217,12 +249,13 @@ class BlogGenerator:
                 print(f"Is Topic: {is_topic}")
                 print(f"Debug: {debug}")
 
-            blog_generator = BlogGenerator()
+            blog_generator = BlogGenerator(use_cache=self.use_cache)
             generated_blog = blog_generator.generate_text(
                 url,
                 summary=summary,
                 instructions=instructions,
                 is_topic=is_topic,
+                on_field=on_field,
             )
             if generated_blog is None:
                 return None
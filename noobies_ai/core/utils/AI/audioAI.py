@@ -1,28 +1,61 @@
-from clarifai.client.model import Model
+from .client_pool import clarifai_model
+from concurrent.futures import ThreadPoolExecutor
+from pydub import AudioSegment
+from ..cache.disk_cache import DiskCache, default_cache_dir, hash_file, hash_key
+from ..cache.word_table import WordTable, pack_words
+import os
+import shutil
+from .transcription import get_engine
 
-
-from clarifai.client.model import Model
+# inference parameters that change the generated speech
+TTS_CACHE_PARAMS = [
+    "voice-id",
+    "model_id",
+    "stability",
+    "similarity_boost",
+    "style",
+    "use_speaker_boost",
+    "language",
+]
 
 
 class AudioAI:
     def __init__(
         self,
         model_url="https://clarifai.com/eleven-labs/audio-generation/models/speech-synthesis",
+        cache_dir=None,
+        cache_max_bytes=512 * 1024**2,
+        use_cache=True,
     ):
         """
         Initializes the AudioAI class.
 
         Args:
             model_url (str): URL of the audio generation model (default: "https://clarifai.com/eleven-labs/audio-generation/models/speech-synthesis").
+            cache_dir (str): Directory of the generated audio cache, None for the "tts" folder of
+                the noobies_ai cache directory (default: None). Transcriptions are cached
+                in its sibling "transcriptions" folder.
+            cache_max_bytes (int): Size limit of the audio cache (default: 512 MB).
+            use_cache (bool): Whether generated audio and transcriptions are cached and reused (default: True).
         """
         self.model_url = model_url
-        self.llm = Model(
-            model_url,
-        )
+        self.cache = None
+        self.transcription_cache = None
+        if use_cache:
+            cache_dir = cache_dir or default_cache_dir("tts")
+            self.cache = DiskCache.shared(cache_dir, cache_max_bytes)
+            self.transcription_cache = DiskCache.shared(
+                os.path.join(os.path.dirname(cache_dir), "transcriptions"),
+                64 * 1024**2,
+                suffix=".npz",
+            )
+        # shared with every other AudioAI of the same model
+        self.llm = clarifai_model(url=model_url)
         self.voice_ids = {
             "male1": "2EiwWnXFnvU5JabPnv8n",
             "female1": "LcfcDJNUP1GQjkzn1xUU",
         }
+        self.last_timings = None
 
     def generate(
         self,
@@ -50,17 +83,97 @@ class AudioAI:
             bool: True if the audio generation is successful, False otherwise.
         """
         try:
+            key = None
+            if self.cache is not None:
+                key = self.cache_key(prompt, inference_params)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    shutil.copyfile(cached, output_file)
+                    print(f"audio reused from cache, {self.cache.stats()}")
+                    return True
+
             prediction = self.llm.predict_by_bytes(
                 prompt.encode(), input_type="text", inference_params=inference_params
             )
             output_base64 = prediction.outputs[0].data.audio.base64
             with open(output_file, "wb") as f:
                 f.write(output_base64)
+            if key is not None:
+                self.cache.put_bytes(key, output_base64)
+                self.cache.evict()
             return True
         except Exception as e:
             print(e)
             return False
 
+    def cache_key(self, prompt, inference_params):
+        """
+        Returns the cache key of a generation.
+
+        Args:
+            prompt (str): The prompt for generating the audio.
+            inference_params (dict): Inference parameters for the audio generation.
+
+        Returns:
+            str: The cache key.
+        """
+        params = {name: inference_params.get(name) for name in TTS_CACHE_PARAMS}
+        return hash_key("tts", self.model_url, prompt, params)
+
+    def generate_parts(
+        self,
+        parts,
+        inference_params,
+        output_file="audio.mp3",
+        max_workers=4,
+    ):
+        """
+        Generates the audio of every part concurrently and joins them into one file.
+
+        Args:
+            parts (list): The texts, in order.
+            inference_params (dict): Inference parameters for the audio generation, see generate.
+            output_file (str): The output file path for saving the joined audio (default: "audio.mp3").
+            max_workers (int): Number of parts generated at the same time (default: 4).
+
+        Returns:
+            list: (start, end) offset in seconds of each part in the joined audio, None if a part failed.
+        """
+        base, ext = os.path.splitext(output_file)
+        part_files = [f"{base}.part{i}{ext}" for i in range(len(parts))]
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(
+                    executor.map(
+                        lambda part, part_file: self.generate(
+                            part,
+                            inference_params=inference_params,
+                            output_file=part_file,
+                        ),
+                        parts,
+                        part_files,
+                    )
+                )
+            if not all(results):
+                print("Error generating audio parts")
+                return None
+
+            audio = AudioSegment.empty()
+            offsets = []
+            for part_file in part_files:
+                start = len(audio)
+                audio += AudioSegment.from_file(part_file)
+                offsets.append((start / 1000, len(audio) / 1000))
+            audio.export(output_file, format=ext.lstrip(".") or "mp3")
+            return offsets
+        except Exception as e:
+            print(e)
+            return None
+        finally:
+            for part_file in part_files:
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+
     def get_voice_ids(self):
         """
         Get the available voice IDs.
@@ -70,24 +183,65 @@ class AudioAI:
         """
         return self.voice_ids
 
-    def get_transcription(self, audio_path, word_timestamps=True):
+    @staticmethod
+    def warm_up(model_name="base.en", engine=None):
+        """
+        Loads a transcription model in the background so the first transcription does not wait for it.
+
+        Args:
+            model_name (str): Name of the model (default: "base.en").
+            engine (str): Transcription engine, see transcription.get_engine (default: None).
+
+        Returns:
+            threading.Thread: The loading thread, None if the model is loaded or loading.
+        """
+        return get_engine(engine, model_name=model_name).warm_up()
+
+    def get_transcription(
+        self, audio_path, word_timestamps=True, model_name="base.en", engine=None
+    ):
         """
         Get the transcription of an audio file.
 
+        The model is loaded once per process and shared, see ModelRegistry.
+        The time spent waiting for the model and the time spent transcribing
+        are printed and kept in last_timings. Results are cached by the content
+        of the audio, so restyling the subtitles of a video does not transcribe
+        it again.
+
         Args:
             audio_path (str): The path to the audio file.
             word_timestamps (bool): Whether to include word timestamps in the transcription (default: True).
+            model_name (str): Name of the model (default: "base.en").
+            engine (str): Transcription engine, "whisper" or "faster-whisper" for int8 on CPU.
+                None for the NOOBIES_TRANSCRIPTION_ENGINE environment variable,
+                then "whisper" (default: None).
 
         Returns:
-            list: A list of words in the transcription.
+            list: A list of words in the transcription, a lazily loaded WordTable when cached.
         """
-        import whisper
+        transcription_engine = get_engine(engine, model_name=model_name)
+        key = None
+        if self.transcription_cache is not None:
+            key = hash_key(
+                "transcription",
+                hash_file(audio_path),
+                transcription_engine.key,
+                word_timestamps,
+            )
+            cached = self.transcription_cache.get(key)
+            if cached is not None:
+                print(
+                    f"transcription reused from cache, {self.transcription_cache.stats()}"
+                )
+                self.last_timings = {"load": 0.0, "transcribe": 0.0}
+                return WordTable(cached)
 
-        model = whisper.load_model("base.en")
-        result = model.transcribe(audio_path, word_timestamps=word_timestamps)
-        words = []
-        for res in result["segments"]:
-            words.extend(res["words"])
+        words = transcription_engine.transcribe(audio_path, word_timestamps)
+        self.last_timings = transcription_engine.last_timings
+        if key is not None:
+            self.transcription_cache.put_bytes(key, pack_words(words))
+            self.transcription_cache.evict()
         return words
 
 
@@ -0,0 +1,170 @@
+import copy
+import os
+import threading
+import time
+
+
+class ClientPool:
+    """
+    Process-wide pool of Clarifai clients.
+
+    Building a Clarifai Model opens its own gRPC channel, so clients are
+    built once per (kind, user_id, app_id, model_id, PAT) and shared by
+    every caller, across threads and Streamlit sessions. Clients that have
+    not been used for idle_timeout seconds are dropped, which closes their
+    channel once the last reference is gone.
+    """
+
+    idle_timeout = 600
+    _clients = {}
+    _lock = threading.Lock()
+    _stats = {"created": 0, "reused": 0, "evicted": 0}
+
+    @classmethod
+    def get(cls, kind, factory, user_id=None, app_id=None, model_id=None, url=None):
+        """
+        Returns the pooled client for a model, building it on first use.
+
+        Args:
+            kind (str): Kind of client, e.g. "model" or "langchain", as clients of
+                different kinds for the same model are not interchangeable.
+            factory (callable): Called without arguments to build the client.
+            user_id (str, optional): User ID of the model. Defaults to None.
+            app_id (str, optional): App ID of the model. Defaults to None.
+            model_id (str, optional): Model ID of the model. Defaults to None.
+            url (str, optional): URL of the model, used instead of the IDs. Defaults to None.
+
+        Returns:
+            object: The client.
+        """
+        # the PAT is part of the key, so sessions with different PATs never share a client
+        key = (kind, url, user_id, app_id, model_id, os.environ.get("CLARIFAI_PAT"))
+        with cls._lock:
+            cls._evict_idle(time.monotonic())
+            entry = cls._clients.get(key)
+            if entry is not None:
+                entry[1] = time.monotonic()
+                cls._stats["reused"] += 1
+                return entry[0]
+        # built outside the lock, a slow client must not block other lookups;
+        # when two callers race, the first one stored wins
+        client = factory()
+        with cls._lock:
+            entry = cls._clients.setdefault(key, [client, time.monotonic()])
+            entry[1] = time.monotonic()
+            cls._stats["created" if entry[0] is client else "reused"] += 1
+            return entry[0]
+
+    @classmethod
+    def _evict_idle(cls, now):
+        """Drops the clients idle for longer than idle_timeout, call with the lock held."""
+        for key, (_, last_used) in list(cls._clients.items()):
+            if now - last_used > cls.idle_timeout:
+                del cls._clients[key]
+                cls._stats["evicted"] += 1
+
+    @classmethod
+    def clear(cls):
+        """Drops every client."""
+        with cls._lock:
+            cls._stats["evicted"] += len(cls._clients)
+            cls._clients.clear()
+
+    @classmethod
+    def stats(cls):
+        """
+        Returns the pool counters.
+
+        Returns:
+            dict: "created", "reused", "evicted" and "size" counts.
+        """
+        with cls._lock:
+            return dict(cls._stats, size=len(cls._clients))
+
+
+class SharedModel:
+    """
+    A pooled clarifai Model that is safe to call from several threads.
+
+    Model.predict writes the inference params into the model_info of the
+    Model before sending the request, so concurrent calls on one Model could
+    send each other's params, e.g. the voice of another TTS request. Every
+    attribute access is served by a lightweight copy with its own model_info
+    that shares the gRPC stub, and so the channel, of the pooled Model.
+    """
+
+    def __init__(self, model):
+        """
+        Initializes the SharedModel class.
+
+        Args:
+            model (clarifai.client.model.Model): The pooled model.
+        """
+        self.model = model
+
+    def copy(self):
+        """
+        Returns a copy of the pooled model for one call.
+
+        Returns:
+            clarifai.client.model.Model: The copy.
+        """
+        # not copy.copy, Model.__getattr__ recurses on a half built instance
+        clone = object.__new__(type(self.model))
+        clone.__dict__.update(self.model.__dict__)
+        clone.model_info = copy.deepcopy(self.model.model_info)
+        return clone
+
+    def __getattr__(self, name):
+        return getattr(self.copy(), name)
+
+
+def clarifai_model(user_id=None, app_id=None, model_id=None, url=None):
+    """
+    Returns a pooled clarifai Model, see SharedModel.
+
+    Args:
+        user_id (str, optional): User ID of the model. Defaults to None.
+        app_id (str, optional): App ID of the model. Defaults to None.
+        model_id (str, optional): Model ID of the model. Defaults to None.
+        url (str, optional): URL of the model, used instead of the IDs. Defaults to None.
+
+    Returns:
+        SharedModel: The model client, used like a clarifai.client.model.Model.
+    """
+    from clarifai.client.model import Model
+
+    def factory():
+        if url is not None:
+            return Model(url)
+        return Model(user_id=user_id, app_id=app_id, model_id=model_id)
+
+    return SharedModel(
+        ClientPool.get(
+            "model", factory, user_id=user_id, app_id=app_id, model_id=model_id, url=url
+        )
+    )
+
+
+if __name__ == "__main__":
+    from clarifai.client.model import Model
+    from dotenv import load_dotenv
+
+    # per call setup overhead, building a client every time vs. the pool
+    load_dotenv()
+    n = 50
+    ids = {"user_id": "openai", "app_id": "dall-e", "model_id": "dall-e-3"}
+
+    start = time.perf_counter()
+    for _ in range(n):
+        Model(**ids)
+    direct = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    for _ in range(n):
+        clarifai_model(**ids)
+    pooled = (time.perf_counter() - start) / n
+
+    print(f"new Model per call: {direct * 1000:.2f} ms")
+    print(f"pooled Model:       {pooled * 1000:.3f} ms")
+    print(ClientPool.stats())
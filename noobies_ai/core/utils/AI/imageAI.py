@@ -1,13 +1,72 @@
-from clarifai.client.model import Model
+from .client_pool import clarifai_model
+from ..cache.disk_cache import (
+    DiskCache,
+    default_cache_dir,
+    hash_key,
+    link_or_copy,
+    normalize_text,
+)
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+    wait,
+)
+import os
+import re
+import threading
+import time
+
+# status codes with which a model rejects the number of inputs of a prediction,
+# the clarifai ones and the gRPC one. Other errors, e.g. a prompt refused by
+# moderation, a network error or a rate limit, say nothing about batch support
+BATCH_REJECTION_CODES = {"INPUT_OVER_LIMIT", "NOT_IMPLEMENTED", "UNIMPLEMENTED"}
+# the status in the message of a failed clarifai prediction, "code: INPUT_OVER_LIMIT"
+STATUS_CODE = re.compile(r"\bcode:\s*([A-Z_]+)")
+
+
+def batch_rejected(error):
+    """
+    Whether an error of a batch prediction means the model does not support batches.
+
+    Args:
+        error (Exception): The error raised by the prediction.
+
+    Returns:
+        bool: True when the number of inputs was rejected, False for any other error.
+    """
+    code = getattr(error, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    codes = set(STATUS_CODE.findall(str(error)))
+    codes.add(getattr(code, "name", None))
+    # raised by the clarifai SDK itself, before sending the request
+    return (
+        bool(codes & BATCH_REJECTION_CODES) or "too many inputs" in str(error).lower()
+    )
 
 
 class ImageAI:
+    # models that rejected multi-input predictions, not tried again
+    batch_unsupported = set()
+    max_batch_size = 16
+    # remote generations, to estimate the time saved by the cache
+    api_calls = 0
+    api_seconds = 0.0
+    api_lock = threading.Lock()
+
     def __init__(
         self,
         user_id="openai",
         app_id="dall-e",
         model_id="dall-e-3",
         model_version_id="dc9dcb6ee67543cebc0b9a025861b868",
+        cache_dir=None,
+        cache_max_bytes=1024**3,
+        use_cache=True,
     ):
         """
         Initializes the ImageAI class.
@@ -17,20 +76,98 @@ class ImageAI:
             app_id (str): App ID for the model (default: "dall-e").
             model_id (str): Model ID for the model (default: "dall-e-3").
             model_version_id (str): Model version ID for the model (default: "dc9dcb6ee67543cebc0b9a025861b868").
+            cache_dir (str): Directory of the generated image cache, None for the "images" folder of
+                the noobies_ai cache directory (default: None).
+            cache_max_bytes (int): Size limit of the image cache (default: 1 GB).
+            use_cache (bool): Whether generated images are cached and reused (default: True).
         """
         self.user_id = user_id
         self.app_id = app_id
         self.model_id = model_id
         self.model_version_id = model_version_id
-        self.llm = Model(
+        # shared with every other ImageAI of the same model
+        self.llm = clarifai_model(
             user_id=self.user_id, app_id=self.app_id, model_id=self.model_id
         )
+        self.cache = None
+        if use_cache:
+            self.cache = DiskCache.shared(
+                cache_dir or default_cache_dir("images"), cache_max_bytes, ".png"
+            )
+
+    def cache_key(self, prompt, inference_params):
+        """
+        Returns the cache key of a generation.
+
+        Args:
+            prompt (str): The prompt for generating the image.
+            inference_params (dict): Inference parameters for the model.
+
+        Returns:
+            str: The cache key.
+        """
+        params = {
+            name: value
+            for name, value in inference_params.items()
+            if name != "batch_size"
+        }
+        return hash_key(
+            "image",
+            self.user_id,
+            self.app_id,
+            self.model_id,
+            normalize_text(prompt),
+            params,
+        )
+
+    def from_cache(self, prompt, inference_params, output_file):
+        """
+        Links a cached image to output_file.
+
+        Returns:
+            bool: True on a hit, False otherwise.
+        """
+        if self.cache is None:
+            return False
+        cached = self.cache.get(self.cache_key(prompt, inference_params))
+        if cached is None:
+            return False
+        link_or_copy(cached, output_file)
+        return True
+
+    def to_cache(self, prompt, inference_params, image, latency):
+        """Stores a generated image and counts the remote call."""
+        with ImageAI.api_lock:
+            ImageAI.api_calls += 1
+            ImageAI.api_seconds += latency
+        if self.cache is not None:
+            self.cache.put_bytes(self.cache_key(prompt, inference_params), image)
+            self.cache.evict()
+
+    def cache_stats(self):
+        """
+        Returns the hit rate of the image cache and the API time it saved.
+
+        Returns:
+            dict: "hits", "misses", "hit_rate", "api_calls" and "saved_seconds", the hits
+                times the mean latency of the remote calls.
+        """
+        cache = self.cache or DiskCache.shared(default_cache_dir("images"))
+        stats = cache.stats()
+        with ImageAI.api_lock:
+            mean_latency = (
+                ImageAI.api_seconds / ImageAI.api_calls if ImageAI.api_calls else 0.0
+            )
+            stats["api_calls"] = ImageAI.api_calls
+        stats["saved_seconds"] = stats["hits"] * mean_latency
+        return stats
 
     def generate(
         self,
         prompt,
         inference_params={"quality": "standard", "size": "1024x1024"},
         output_file="image.png",
+        check_cache=True,
     ):
         """
         Generates an image based on the given prompt.
@@ -39,9 +176,18 @@ class ImageAI:
             prompt (str): The prompt for generating the image.
             inference_params (dict): Inference parameters for the model (default: {"quality": "standard", "size": "1024x1024"}).
             output_file (str): Output file name for the generated image (default: "image.png").
+            check_cache (bool): Whether to look the image up in the cache first, callers that
+                already did pass False (default: True).
+
+        Returns:
+            bool: True if the image is generated successfully, False otherwise.
         """
         try:
-            inference_params["batch_size"] = 1
+            if check_cache and self.from_cache(prompt, inference_params, output_file):
+                return True
+            # copied, the default dict is shared by every call
+            inference_params = dict(inference_params, batch_size=1)
+            start = time.perf_counter()
             model_prediction = self.llm.predict_by_bytes(
                 prompt.encode(), input_type="text", inference_params=inference_params
             )
@@ -49,8 +195,223 @@ class ImageAI:
 
             with open(output_file, "wb") as f:
                 f.write(output_base64)
+            self.to_cache(
+                prompt, inference_params, output_base64, time.perf_counter() - start
+            )
+            return True
         except Exception as e:
             print(f"Error generating image: {e}")
+            return False
+
+    def generate_many(
+        self,
+        prompts,
+        output_files,
+        inference_params={"quality": "standard", "size": "1024x1024"},
+        max_workers=4,
+        timeout=120,
+        check_cache=True,
+    ):
+        """
+        Generates several images concurrently.
+
+        Every image is written to its own output file, so the order of the
+        prompts is kept no matter which request finishes first. A request
+        running longer than timeout is reported as failed, and its image is
+        discarded should it arrive later.
+
+        Args:
+            prompts (list): The prompts, in order.
+            output_files (list): Output file of each prompt.
+            inference_params (dict): Inference parameters for the model (default: {"quality": "standard", "size": "1024x1024"}).
+            max_workers (int): Number of requests running at the same time (default: 4).
+            timeout (float): Seconds after which a running request is given up (default: 120).
+            check_cache (bool): Whether to look the images up in the cache first (default: True).
+
+        Returns:
+            list: One dict per prompt with "output_file", "ok", "latency" and "error" keys.
+        """
+        results = [
+            {"output_file": output_file, "ok": False, "latency": None, "error": None}
+            for output_file in output_files
+        ]
+        started = {}
+        finished = {}
+        timed_out = set()
+        lock = threading.Lock()
+
+        def task(i):
+            with lock:
+                started[i] = time.perf_counter()
+            tmp_file = f"{output_files[i]}.{os.getpid()}.{i}.tmp"
+            try:
+                ok = self.generate(
+                    prompts[i], inference_params, tmp_file, check_cache=check_cache
+                )
+            finally:
+                with lock:
+                    finished[i] = time.perf_counter()
+            with lock:
+                if ok and i not in timed_out:
+                    os.replace(tmp_file, output_files[i])
+                elif os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+            return ok
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {executor.submit(task, i): i for i in range(len(prompts))}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                now = time.perf_counter()
+                with lock:
+                    for future in done:
+                        i = futures[future]
+                        if i in timed_out:
+                            continue
+                        results[i]["latency"] = finished[i] - started[i]
+                        results[i]["ok"] = (
+                            future.exception() is None and future.result()
+                        )
+                        if future.exception() is not None:
+                            results[i]["error"] = str(future.exception())
+                        elif not results[i]["ok"]:
+                            results[i]["error"] = "generation failed"
+                    for future in list(pending):
+                        i = futures[future]
+                        if i in started and now - started[i] > timeout:
+                            timed_out.add(i)
+                            results[i]["latency"] = now - started[i]
+                            results[i]["error"] = f"timed out after {timeout}s"
+                            pending.discard(future)
+        finally:
+            # timed out requests cannot be interrupted, do not wait for them
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for i, result in enumerate(results):
+            status = "ok" if result["ok"] else f"failed ({result['error']})"
+            latency = result["latency"] or 0.0
+            print(f"image {i}: {status} in {latency:.1f}s")
+        print(
+            f"{sum(result['ok'] for result in results)}/{len(results)} images generated"
+        )
+        return results
+
+    def generate_batch(
+        self,
+        prompts,
+        output_dir,
+        inference_params={"quality": "standard", "size": "1024x1024"},
+        max_workers=4,
+        timeout=120,
+    ):
+        """
+        Generates images in as few remote calls as the model allows.
+
+        Prompts are sent as multi-input predictions of up to max_batch_size
+        inputs. When the model does not support them, or some outputs come
+        back empty, the remaining prompts go through generate_many. A model is
+        only marked as not supporting batches when it rejects one; a batch that
+        fails otherwise, or takes longer than timeout, falls back on its own.
+
+        Args:
+            prompts (list): The prompts, in order.
+            output_dir (str): Folder the images are written to as 0.png, 1.png, ...
+            inference_params (dict): Inference parameters for the model (default: {"quality": "standard", "size": "1024x1024"}).
+            max_workers (int): Number of concurrent requests of the fallback (default: 4).
+            timeout (float): Seconds after which a batch or fallback request is given up (default: 120).
+
+        Returns:
+            list: One dict per prompt with "output_file", "ok", "latency" and "error" keys.
+        """
+        from clarifai.client.input import Inputs
+
+        output_files = [
+            os.path.abspath(os.path.join(output_dir, f"{i}.png"))
+            for i in range(len(prompts))
+        ]
+        results = [
+            {"output_file": output_file, "ok": False, "latency": None, "error": None}
+            for output_file in output_files
+        ]
+        for i, prompt in enumerate(prompts):
+            if self.from_cache(prompt, inference_params, output_files[i]):
+                results[i].update(ok=True, latency=0.0)
+        uncached = [i for i, result in enumerate(results) if not result["ok"]]
+
+        model_key = (self.user_id, self.app_id, self.model_id)
+        if len(uncached) > 1 and model_key not in ImageAI.batch_unsupported:
+            # the calls run in a worker so they can be given up after timeout
+            executor = ThreadPoolExecutor(max_workers=1)
+            try:
+                for first in range(0, len(uncached), self.max_batch_size):
+                    batch = uncached[first : first + self.max_batch_size]
+                    inputs = [
+                        Inputs.get_text_input(input_id=str(i), raw_text=prompts[i])
+                        for i in batch
+                    ]
+                    start = time.perf_counter()
+                    try:
+                        prediction = executor.submit(
+                            self.llm.predict,
+                            inputs,
+                            inference_params=dict(inference_params),
+                        ).result(timeout=timeout)
+                    except FutureTimeoutError:
+                        # the worker is still busy, the rest is generated one by one
+                        print(f"Batch prediction timed out after {timeout}s")
+                        break
+                    except Exception as e:
+                        if batch_rejected(e):
+                            print(
+                                f"Batch prediction not supported, generating one by one: {e}"
+                            )
+                            ImageAI.batch_unsupported.add(model_key)
+                            break
+                        print(f"Batch prediction failed, generating it one by one: {e}")
+                        continue
+                    latency = time.perf_counter() - start
+                    # outputs are not guaranteed to come back in input order
+                    outputs = {output.input.id: output for output in prediction.outputs}
+                    for i in batch:
+                        output = outputs.get(str(i))
+                        image = output.data.image.base64 if output is not None else None
+                        if not image:
+                            continue
+                        with open(output_files[i], "wb") as f:
+                            f.write(image)
+                        # the API time of the batch, split over its images
+                        self.to_cache(
+                            prompts[i], inference_params, image, latency / len(inputs)
+                        )
+                        results[i].update(ok=True, latency=latency)
+                    print(f"batch of {len(inputs)} images in {latency:.1f}s")
+                    if len(prediction.outputs) < len(inputs):
+                        # the model only answered some inputs, e.g. the first one
+                        print(
+                            f"{len(prediction.outputs)} outputs for {len(inputs)} inputs, generating one by one"
+                        )
+                        ImageAI.batch_unsupported.add(model_key)
+                        break
+            finally:
+                # a timed out call cannot be interrupted, do not wait for it
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        missing = [i for i, result in enumerate(results) if not result["ok"]]
+        if missing:
+            fallback = self.generate_many(
+                [prompts[i] for i in missing],
+                [output_files[i] for i in missing],
+                inference_params=inference_params,
+                max_workers=max_workers,
+                timeout=timeout,
+                check_cache=False,
+            )
+            for i, result in zip(missing, fallback):
+                results[i] = result
+        print(f"image cache: {self.cache_stats()}")
+        return results
 
 
 if __name__ == "__main__":
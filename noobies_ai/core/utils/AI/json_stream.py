@@ -0,0 +1,178 @@
+import json
+
+WHITESPACE = " \t\r\n"
+
+
+class JSONStreamAssembler:
+    """
+    Parses a JSON document while it is streamed, chunk by chunk.
+
+    Every value that closes at most max_depth levels below the root is
+    reported as soon as its last character arrives, with its path from
+    the root, e.g. ("title",), ("content", 0) or ("scripts", "part1").
+    Text before the root object, such as a ```json fence, is skipped.
+
+    Tracking ends with the first top-level value: done is set and root holds
+    the parsed value, or None when it was not valid JSON. Malformed text that
+    cannot be followed, such as an extra closing bracket, ends tracking the
+    same way instead of raising.
+    """
+
+    def __init__(self, max_depth=2):
+        """
+        Initializes the JSONStreamAssembler class.
+
+        Args:
+            max_depth (int): Deepest level reported, the root is level 0 (default: 2).
+        """
+        self.max_depth = max_depth
+        self.buffer = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.primitive_start = None
+        self.started = False
+        self.done = False
+        self.root = None
+
+    def _child_path(self):
+        """Returns the path of the value starting at the current position."""
+        if not self.stack:
+            return ()
+        frame = self.stack[-1]
+        if frame["type"] == "object":
+            return frame["path"] + (frame["key"],)
+        return frame["path"] + (frame["index"],)
+
+    def _complete(self, start, end, path, events):
+        """Records a value that just closed."""
+        if len(path) > self.max_depth and path:
+            return
+        try:
+            value = json.loads(self.buffer[start:end])
+        except ValueError:
+            return
+        if path:
+            events.append((path, value))
+        else:
+            self.root = value
+
+    def _abandon(self):
+        """Stops tracking text that is not JSON this class can follow."""
+        self.done = True
+        self.root = None
+
+    def feed(self, chunk):
+        """
+        Adds the next chunk of text.
+
+        Args:
+            chunk (str): The text received.
+
+        Returns:
+            list: (path, value) of every value completed by this chunk.
+        """
+        events = []
+        self.buffer += chunk
+        while self.pos < len(self.buffer) and not self.done:
+            i = self.pos
+            c = self.buffer[i]
+            self.pos += 1
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    frame = self.stack[-1] if self.stack else None
+                    if frame and frame["type"] == "object" and frame["expect"] == "key":
+                        try:
+                            frame["key"] = json.loads(
+                                self.buffer[self.string_start : i + 1]
+                            )
+                        except ValueError:
+                            self._abandon()
+                            break
+                        frame["expect"] = "colon"
+                    else:
+                        self._complete(
+                            self.string_start, i + 1, self._child_path(), events
+                        )
+                continue
+
+            if self.primitive_start is not None:
+                if c not in ",]}" and c not in WHITESPACE:
+                    continue
+                self._complete(self.primitive_start, i, self._child_path(), events)
+                self.primitive_start = None
+
+            if not self.started:
+                if c not in "{[":
+                    continue
+                self.started = True
+
+            if c in "{[":
+                self.stack.append(
+                    {
+                        "type": "object" if c == "{" else "array",
+                        "path": self._child_path(),
+                        "start": i,
+                        "key": None,
+                        "index": 0,
+                        "expect": "key",
+                    }
+                )
+            elif c in "}]":
+                if not self.stack or self.stack[-1]["type"] != (
+                    "object" if c == "}" else "array"
+                ):
+                    self._abandon()
+                    break
+                frame = self.stack.pop()
+                self._complete(frame["start"], i + 1, frame["path"], events)
+                if not self.stack:
+                    # only the first top-level value is tracked, valid or not
+                    self.done = True
+            elif c == '"':
+                self.in_string = True
+                self.string_start = i
+            elif not self.stack:
+                self._abandon()
+                break
+            elif c == ":":
+                self.stack[-1]["expect"] = "value"
+            elif c == ",":
+                frame = self.stack[-1]
+                if frame["type"] == "object":
+                    frame["expect"] = "key"
+                else:
+                    frame["index"] += 1
+            elif c not in WHITESPACE:
+                self.primitive_start = i
+        return events
+
+
+def assemble(chunks, on_field, max_depth=2):
+    """
+    Joins a streamed response, calling on_field for each field as soon as it closes.
+
+    Args:
+        chunks (iterable): The chunks of the response, e.g. from TextAI.stream.
+        on_field (callable): Called with (path, value) for every completed field.
+        max_depth (int): Deepest level reported, see JSONStreamAssembler (default: 2).
+
+    Returns:
+        str: The whole response.
+    """
+    assembler = JSONStreamAssembler(max_depth=max_depth)
+    for chunk in chunks:
+        for path, value in assembler.feed(chunk):
+            try:
+                on_field(path, value)
+            except Exception as e:
+                print(f"Error handling field {path}: {e}")
+    return assembler.buffer
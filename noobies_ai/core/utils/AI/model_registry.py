@@ -0,0 +1,105 @@
+import threading
+import time
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded models.
+
+    Every model is loaded once per process and shared by all callers, which
+    includes every Streamlit session of the server. Concurrent requests for
+    a model that is still loading wait for that load instead of starting
+    their own. Each model also gets a lock, for models that are not safe to
+    run from several threads at once.
+    """
+
+    _models = {}
+    _loading = {}
+    _locks = {}
+    _load_times = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, key, loader):
+        """
+        Returns a model, loading it on first use.
+
+        Args:
+            key (str): Name of the model in the registry.
+            loader (callable): Called without arguments to load the model.
+
+        Returns:
+            object: The loaded model.
+        """
+        with cls._lock:
+            if key in cls._models:
+                return cls._models[key]
+            event = cls._loading.get(key)
+            owner = event is None
+            if owner:
+                event = cls._loading[key] = threading.Event()
+                cls._locks.setdefault(key, threading.Lock())
+
+        if not owner:
+            event.wait()
+            with cls._lock:
+                if key in cls._models:
+                    return cls._models[key]
+            # the load we waited for failed, try again
+            return cls.get(key, loader)
+
+        try:
+            start = time.perf_counter()
+            model = loader()
+            load_time = time.perf_counter() - start
+            print(f"loaded {key} in {load_time:.2f}s")
+            with cls._lock:
+                cls._models[key] = model
+                cls._load_times[key] = load_time
+            return model
+        finally:
+            with cls._lock:
+                del cls._loading[key]
+            event.set()
+
+    @classmethod
+    def warm_up(cls, key, loader):
+        """
+        Loads a model in a background thread, returns immediately.
+
+        Args:
+            key (str): Name of the model in the registry.
+            loader (callable): Called without arguments to load the model.
+
+        Returns:
+            threading.Thread: The loading thread, None if the model is loaded or loading.
+        """
+        with cls._lock:
+            if key in cls._models or key in cls._loading:
+                return None
+
+        def load():
+            try:
+                cls.get(key, loader)
+            except Exception as e:
+                print(f"Error warming up {key}: {e}")
+
+        thread = threading.Thread(target=load, name=f"warm-up {key}", daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    def lock(cls, key):
+        """Returns the lock serializing the use of a model."""
+        with cls._lock:
+            return cls._locks.setdefault(key, threading.Lock())
+
+    @classmethod
+    def is_loaded(cls, key):
+        """Returns whether a model is loaded."""
+        return key in cls._models
+
+    @classmethod
+    def load_time(cls, key):
+        """Returns the time in seconds it took to load a model, None if not loaded."""
+        return cls._load_times.get(key)
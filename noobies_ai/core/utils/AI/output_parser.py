@@ -0,0 +1,498 @@
+import json
+import re
+import threading
+
+# values of these names outside strings are Python literals, not JSON
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+# a key and its colon, what follows a value whose comma is missing
+NEXT_KEY = re.compile(r'"(?:[^"\\\n]|\\.)*"\s*:')
+# tokens per word relative to English, Devanagari is split into many more tokens
+LANGUAGE_TOKEN_SCALE = {"en": 1, "hi": 3}
+
+
+def _object_end(text, start):
+    """Returns the index after the bracket closing the value at start, None if it is never closed."""
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def extract_json(text):
+    """
+    Locates the JSON object in a model response.
+
+    Code fences and any text before the first "{" or after the matching "}"
+    are dropped. An object that is never closed runs to the end of the text.
+
+    Args:
+        text (str): The response.
+
+    Returns:
+        str: The text of the object, None if there is no "{".
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    end = _object_end(text, start)
+    return text[start:end]
+
+
+def is_truncated(text):
+    """
+    Whether the JSON object of a response was cut off before its closing bracket.
+
+    Such a response can be closed by repair_json, but whatever came after the
+    cut, e.g. the remaining script parts, is missing.
+
+    Args:
+        text (str): The response.
+
+    Returns:
+        bool: True when there is an object and it is never closed.
+    """
+    start = text.find("{")
+    return start != -1 and _object_end(text, start) is None
+
+
+def _skip_space(text, i):
+    """Returns the index of the first non-whitespace character at or after i."""
+    while i < len(text) and text[i] in " \t\r\n":
+        i += 1
+    return i
+
+
+def _next_char(text, i):
+    """Returns the first non-whitespace character at or after i, "" at the end."""
+    i = _skip_space(text, i)
+    return text[i] if i < len(text) else ""
+
+
+def _closes_string(text, i):
+    """Whether the quote at i ends the string, rather than being an unescaped quote inside it."""
+    following = _next_char(text, i + 1)
+    if following in ("", ":", "}", "]"):
+        return True
+    if following == '"':
+        return NEXT_KEY.match(text, _skip_space(text, i + 1)) is not None
+    if following == ",":
+        after = _skip_space(text, text.index(",", i + 1) + 1)
+        return text.startswith("//", after) or _next_char(text, after) in (
+            '"',
+            "{",
+            "[",
+            "}",
+            "]",
+            "",
+        )
+    return False
+
+
+def repair_json(text):
+    """
+    Repairs the usual defects of model written JSON.
+
+    Fixes unescaped quotes, raw newlines and invalid escapes inside strings,
+    trailing and missing commas, // comments, Python literals, text after the
+    root object and a response cut off before its end.
+
+    Args:
+        text (str): The text of the object, see extract_json.
+
+    Returns:
+        str: The repaired text, which may still not be valid JSON.
+    """
+    out = []
+    stack = []
+    in_string = False
+    i = 0
+    n = len(text)
+
+    def last():
+        for part in reversed(out):
+            if part.strip():
+                return part.strip()[-1]
+        return ""
+
+    def drop_trailing_comma():
+        while out and not out[-1].strip():
+            out.pop()
+        if out and out[-1] == ",":
+            out.pop()
+
+    while i < n:
+        c = text[i]
+        if in_string:
+            if c == "\\":
+                if i + 1 < n and text[i + 1] in '"\\/bfnrtu':
+                    out.append(text[i : i + 2])
+                    i += 2
+                    continue
+                out.append("\\\\")
+            elif c == '"':
+                if _closes_string(text, i):
+                    in_string = False
+                    out.append(c)
+                else:
+                    out.append('\\"')
+            elif c == "\n":
+                out.append("\\n")
+            elif c == "\r":
+                out.append("\\r")
+            elif c == "\t":
+                out.append("\\t")
+            elif c >= " ":
+                out.append(c)
+            i += 1
+            continue
+
+        if c == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        if c in '"{[' and last() in ('"', "}", "]") and stack:
+            # two values in a row, the comma between them is missing
+            out.append(",")
+        if c == '"':
+            in_string = True
+            out.append(c)
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+            out.append(c)
+        elif c in "}]":
+            if not stack:
+                break
+            drop_trailing_comma()
+            out.append(stack.pop())
+            if not stack:
+                break
+        else:
+            for name, literal in PYTHON_LITERALS.items():
+                if text.startswith(name, i):
+                    out.append(literal)
+                    i += len(name)
+                    break
+            else:
+                out.append(c)
+                i += 1
+            continue
+        i += 1
+
+    if in_string:
+        out.append('"')
+    if stack:
+        drop_trailing_comma()
+        if last() == ":":
+            out.append("null")
+        while stack:
+            drop_trailing_comma()
+            out.append(stack.pop())
+    return "".join(out)
+
+
+def shape_of(syntax):
+    """
+    Derives the expected shape of a document from its syntax template, e.g. HUGO.
+
+    Objects keep their keys, lists take the shape of their first object (or
+    string) element, and an object whose values all share one object shape,
+    like the parts of SHORT_VIDEO_WITH_IMAGES, becomes a mapping with any keys,
+    written {"*": shape}.
+
+    Args:
+        syntax (dict): The syntax template.
+
+    Returns:
+        object: The shape, made of dicts, one element lists and str.
+    """
+    if isinstance(syntax, dict):
+        shapes = {key: shape_of(value) for key, value in syntax.items()}
+        values = list(shapes.values())
+        if (
+            len(values) > 1
+            and isinstance(values[0], dict)
+            and all(value == values[0] for value in values)
+        ):
+            return {"*": values[0]}
+        return shapes
+    if isinstance(syntax, list):
+        elements = [element for element in syntax if isinstance(element, dict)]
+        return [shape_of(elements[0])] if elements else [str]
+    return str
+
+
+def validate(data, shape, path="$"):
+    """
+    Checks a document against a shape, see shape_of.
+
+    Args:
+        data (object): The parsed document.
+        shape (object): The expected shape.
+        path (str): Path of data, used in the messages (default: "$").
+
+    Returns:
+        list: The problems found, empty when the document is valid.
+    """
+    if shape is str:
+        if isinstance(data, str):
+            return []
+        return [f"{path} should be a string"]
+    if isinstance(shape, list):
+        if not isinstance(data, list):
+            return [f"{path} should be a list"]
+        if shape[0] is not str and not data:
+            return [f"{path} should not be empty"]
+        problems = []
+        for i, element in enumerate(data):
+            problems += validate(element, shape[0], f"{path}[{i}]")
+        return problems
+    if not isinstance(data, dict):
+        return [f"{path} should be an object"]
+    if "*" in shape:
+        if not data:
+            return [f"{path} should not be empty"]
+        problems = []
+        for key, value in data.items():
+            problems += validate(value, shape["*"], f"{path}.{key}")
+        return problems
+    problems = []
+    for key, value_shape in shape.items():
+        if key not in data:
+            problems.append(f"{path}.{key} is missing")
+        else:
+            problems += validate(data[key], value_shape, f"{path}.{key}")
+    return problems
+
+
+def _count_fields(shape, field_tokens):
+    """Returns the tokens of the fields of a shape, as (fixed, per repeated element)."""
+    if shape is str:
+        return 0, 0
+    if isinstance(shape, list) or "*" in shape:
+        element = shape[0] if isinstance(shape, list) else shape["*"]
+        if element is str:
+            return field_tokens.get(None, 64), 0
+        fixed, repeated = _count_fields(element, field_tokens)
+        return 0, fixed + repeated
+    fixed = repeated = 0
+    for key, value in shape.items():
+        if value is str:
+            fixed += field_tokens.get(key, field_tokens.get(None, 64))
+        else:
+            value_fixed, value_repeated = _count_fields(value, field_tokens)
+            fixed += value_fixed
+            repeated += value_repeated
+    return fixed, repeated
+
+
+def token_budget(
+    syntax, items=None, field_tokens=None, extra=0, scale=1, minimum=1024, limit=4096
+):
+    """
+    Estimates the output tokens needed for a document of the given syntax.
+
+    Every string field gets field_tokens tokens and the fields of the repeated
+    elements, e.g. the script parts or blog sections, are counted once per item.
+    The estimate only ever raises the default limit of TextAI, never lowers it.
+
+    Args:
+        syntax (dict): The syntax template.
+        items (int, optional): Number of repeated elements, None for as many as the
+            syntax shows. Defaults to None.
+        field_tokens (dict, optional): Tokens per field name, the None key is the
+            default. Defaults to None, 64 tokens for every field.
+        extra (int, optional): Tokens added, e.g. for the spoken text of a video. Defaults to 0.
+        scale (float, optional): Multiplier for text in a language that takes more tokens per
+            word than English, see LANGUAGE_TOKEN_SCALE. Defaults to 1.
+        minimum (int, optional): Minimum budget. Defaults to 1024.
+        limit (int, optional): Maximum budget. Defaults to 4096.
+
+    Returns:
+        int: The output token budget.
+    """
+    field_tokens = field_tokens or {}
+    if items is None:
+        items = max(
+            [len(value) for value in syntax.values() if isinstance(value, dict)]
+            + [
+                len([element for element in value if isinstance(element, dict)])
+                for value in syntax.values()
+                if isinstance(value, list)
+            ]
+            + [1]
+        )
+    fixed, repeated = _count_fields(shape_of(syntax), field_tokens)
+    estimate = int((fixed + items * repeated + extra) * scale)
+    return min(limit, max(minimum, estimate))
+
+
+class OutputParser:
+    """
+    Turns a model response into a document of the expected shape.
+
+    The JSON object is located in the response and parsed as is, then
+    repaired locally if that fails. Only when local repair cannot produce a
+    valid document is the optional repair callback asked for a corrected
+    response, which is much cheaper than generating the whole text again.
+    A response cut off before its end is never accepted locally, closing its
+    brackets would silently drop what was not generated.
+    How often each path is taken is counted across all parsers.
+    """
+
+    _lock = threading.Lock()
+    _stats = {
+        "parsed": 0,
+        "repaired": 0,
+        "truncated": 0,
+        "repair_requests": 0,
+        "failed": 0,
+    }
+
+    def __init__(self, syntax, check=None):
+        """
+        Initializes the OutputParser class.
+
+        Args:
+            syntax (dict): The syntax template the response should follow, e.g. HUGO.
+            check (callable, optional): Called with a document of the expected shape, returns
+                a list of further problems, e.g. a wrong number of script parts. Defaults to None.
+        """
+        self.syntax = syntax
+        self.shape = shape_of(syntax)
+        self.check = check
+
+    def _count(self, name):
+        with OutputParser._lock:
+            OutputParser._stats[name] += 1
+
+    def _problems(self, data):
+        """Returns what is wrong with a parsed document, empty when it is valid."""
+        problems = validate(data, self.shape)
+        if not problems and self.check is not None:
+            problems = list(self.check(data))
+        return problems
+
+    def complete(self, data):
+        """
+        Whether a parsed document has the expected shape, usable as TextAI's until.
+
+        Args:
+            data (object): The parsed document.
+
+        Returns:
+            bool: True when the document is valid.
+        """
+        return not self._problems(data)
+
+    def _load(self, text):
+        """Returns (document, None, "parsed" or "repaired"), or (None, problem, None or "truncated")."""
+        candidate = extract_json(text)
+        if candidate is None:
+            return None, "no JSON object found", None
+        if is_truncated(text):
+            return (
+                None,
+                "the response was cut off, complete the missing part",
+                "truncated",
+            )
+        for repaired, attempt in enumerate((candidate, repair_json(candidate))):
+            try:
+                data = json.loads(attempt)
+            except ValueError as e:
+                error = f"invalid JSON: {e}"
+                continue
+            problems = self._problems(data)
+            if problems:
+                error = "; ".join(problems)
+                continue
+            return data, None, "repaired" if repaired else "parsed"
+        return None, error, None
+
+    def accepts(self, text):
+        """
+        Whether a response parses locally, usable as TextAI's cache_if.
+
+        Unlike load, nothing is counted.
+
+        Args:
+            text (str): The response.
+
+        Returns:
+            bool: True when load would return a document.
+        """
+        return self._load(text)[0] is not None
+
+    def load(self, text):
+        """
+        Parses a response locally.
+
+        Args:
+            text (str): The response.
+
+        Returns:
+            tuple: (document, None), or (None, description of the problem).
+        """
+        data, error, outcome = self._load(text)
+        if outcome is not None:
+            self._count(outcome)
+        if outcome == "repaired":
+            print(f"Response repaired locally, {OutputParser.stats()}")
+        return data, error
+
+    def parse(self, text, repair=None):
+        """
+        Parses a response, asking for a corrected one if it cannot be repaired locally.
+
+        Args:
+            text (str): The response.
+            repair (callable, optional): Called with (text, error), returns the corrected
+                response. Defaults to None.
+
+        Returns:
+            dict: The document.
+
+        Raises:
+            Exception: If no valid document could be obtained.
+        """
+        data, error = self.load(text)
+        if data is not None:
+            return data
+        if repair is not None:
+            print(f"Asking for a repaired response: {error}")
+            self._count("repair_requests")
+            data, error = self.load(repair(text, error))
+            if data is not None:
+                return data
+        self._count("failed")
+        print(f"Response could not be parsed, {OutputParser.stats()}")
+        raise Exception("Error occurred while parsing the response: " + error)
+
+    @classmethod
+    def stats(cls):
+        """
+        Returns the parser counters.
+
+        Returns:
+            dict: "parsed" (valid as is), "repaired" (repaired locally), "truncated" (cut off
+                before the end), "repair_requests" (sent to the model) and "failed" (to be
+                generated again) counts.
+        """
+        with cls._lock:
+            return dict(cls._stats)
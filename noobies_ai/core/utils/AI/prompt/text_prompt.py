@@ -22,3 +22,14 @@ SUMMERIZE_BLOG = {
                 dont miss any quotables and names of people, places, companies, etc.""",
     "input_variables": ["blog"],
 }
+
+
+REPAIR_JSON = {
+    "template": """- the following output should be json in this syntax: {syntax}
+                - it could not be parsed because: {error}
+                - OUTPUT: {text}
+                - fix only what is wrong and keep all the existing text as it is
+                - return only the fixed json without code block as plain text
+                - use double quotes for keys and values and a backslash before double quotes inside values""",
+    "input_variables": ["syntax", "error", "text"],
+}
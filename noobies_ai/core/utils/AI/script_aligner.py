@@ -0,0 +1,248 @@
+from imageio_ffmpeg import get_ffmpeg_exe
+import numpy as np
+import re
+import subprocess
+import time
+
+BOUNDARY_PUNCTUATION = ".,!?;:"
+
+
+class ScriptAligner:
+    """
+    Times the words of a known script against its voiceover.
+
+    Instead of recognizing the speech, the audio is split into speech and
+    pauses by its short-time energy. The words are spread over the speech
+    in proportion to their number of syllables, and the words ending a
+    phrase (followed by punctuation) are snapped to the detected pauses.
+    The share of phrase ends that found a pause is the confidence of the
+    alignment. Callers fall back to recognition when it is low.
+    """
+
+    def __init__(
+        self,
+        sample_rate=16000,
+        hop=0.01,
+        min_pause=0.15,
+        tolerance=0.4,
+        min_confidence=0.6,
+    ):
+        """
+        Initializes the ScriptAligner class.
+
+        Args:
+            sample_rate (int): Sample rate the audio is decoded at (default: 16000).
+            hop (float): Length in seconds of the energy frames (default: 0.01).
+            min_pause (float): Shortest silence in seconds counted as a pause (default: 0.15).
+            tolerance (float): Largest distance in seconds between a phrase end and the
+                pause it is snapped to (default: 0.4).
+            min_confidence (float): Confidence below which recognition should be used (default: 0.6).
+        """
+        self.sample_rate = sample_rate
+        self.hop = hop
+        self.min_pause = min_pause
+        self.tolerance = tolerance
+        self.min_confidence = min_confidence
+        self.last_timings = None
+
+    def load_audio(self, audio_path):
+        """
+        Decodes an audio file to mono float samples with ffmpeg.
+
+        Args:
+            audio_path (str): The path to the audio file.
+
+        Returns:
+            np.ndarray: The samples, between -1 and 1.
+        """
+        cmd = [
+            get_ffmpeg_exe(),
+            "-loglevel",
+            "error",
+            "-i",
+            audio_path,
+            "-f",
+            "s16le",
+            "-ac",
+            "1",
+            "-ar",
+            str(self.sample_rate),
+            "-",
+        ]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise IOError(
+                f"ffmpeg failed decoding {audio_path}: {result.stderr.decode(errors='ignore')}"
+            )
+        return np.frombuffer(result.stdout, dtype=np.int16) / 32768.0
+
+    def voice_activity(self, samples):
+        """
+        Marks the energy frames that contain speech.
+
+        Args:
+            samples (np.ndarray): Mono samples.
+
+        Returns:
+            tuple: Boolean array with one entry per frame, and the contrast in dB
+                between speech and silence.
+        """
+        hop = int(self.sample_rate * self.hop)
+        n_frames = len(samples) // hop
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool), 0.0
+        frames = samples[: n_frames * hop].reshape(n_frames, hop)
+        energy = 10 * np.log10(np.mean(frames**2, axis=1) + 1e-10)
+        # edge padding, zeros would read as loud frames at both ends of the file
+        energy = np.convolve(np.pad(energy, 2, mode="edge"), np.ones(5) / 5, "valid")
+
+        floor, peak = np.percentile(energy, [10, 95])
+        voiced = energy > floor + 0.35 * (peak - floor)
+        # close short gaps inside words (stops) and drop short clicks
+        voiced = self._fill_runs(voiced, False, 8)
+        voiced = self._fill_runs(voiced, True, 5)
+        return voiced, float(peak - floor)
+
+    def _fill_runs(self, mask, value, max_length):
+        """Flips the inner runs of value shorter than max_length frames."""
+        mask = mask.copy()
+        runs = self._runs(mask, value)
+        for start, end in runs:
+            if end - start < max_length and start > 0 and end < len(mask):
+                mask[start:end] = not value
+        return mask
+
+    def _runs(self, mask, value):
+        """Returns the (start, end) frame ranges where mask equals value."""
+        padded = np.concatenate([[False], mask == value, [False]])
+        changes = np.flatnonzero(np.diff(padded.astype(np.int8)))
+        return list(zip(changes[::2], changes[1::2]))
+
+    def pauses(self, voiced):
+        """
+        Returns the pauses between the first and the last spoken frame.
+
+        Args:
+            voiced (np.ndarray): Speech flags, one per frame.
+
+        Returns:
+            list: Pauses as (start, end) frame ranges.
+        """
+        min_frames = int(round(self.min_pause / self.hop))
+        return [
+            (start, end)
+            for start, end in self._runs(voiced, False)
+            if start > 0 and end < len(voiced) and end - start >= min_frames
+        ]
+
+    def weight(self, word):
+        """Estimates the spoken length of a word by its vowel groups."""
+        syllables = len(re.findall(r"[aeiouy]+", word.lower()))
+        if syllables == 0:
+            # numbers and scripts without latin vowels
+            syllables = len(re.sub(r"\W", "", word)) / 3
+        return max(1.0, syllables)
+
+    def distribute(self, words, voiced_frames):
+        """
+        Spreads words over speech frames in proportion to their weight.
+
+        Args:
+            words (list): The words.
+            voiced_frames (np.ndarray): Indices of the speech frames available.
+
+        Returns:
+            list: (start, end) frame of each word.
+        """
+        weights = np.array([self.weight(word) for word in words])
+        edges = np.concatenate([[0], np.cumsum(weights)]) / weights.sum()
+        positions = np.round(edges * len(voiced_frames)).astype(int)
+        spans = []
+        for a, b in zip(positions[:-1], positions[1:]):
+            a = min(a, len(voiced_frames) - 1)
+            b = max(b, a + 1)
+            spans.append((voiced_frames[a], voiced_frames[b - 1] + 1))
+        return spans
+
+    def align(self, audio_path, script):
+        """
+        Aligns a script with its voiceover.
+
+        Args:
+            audio_path (str): The path to the audio file.
+            script (str): The narration text that was spoken.
+
+        Returns:
+            tuple: Words as dicts with "word", "start", "end" and "probability" keys
+                (the confidence), and the confidence between 0 and 1.
+        """
+        start_time = time.perf_counter()
+        words = script.split()
+        voiced, contrast = self.voice_activity(self.load_audio(audio_path))
+        voiced_frames = np.flatnonzero(voiced)
+        if not words or len(voiced_frames) == 0:
+            return [], 0.0
+
+        boundaries = [
+            i for i, word in enumerate(words[:-1]) if word[-1] in BOUNDARY_PUNCTUATION
+        ]
+        pauses = self.pauses(voiced)
+        tolerance = self.tolerance / self.hop
+        anchors = []
+        previous = 0
+        for i in boundaries:
+            # predict the phrase end from the last anchor, so errors do not add up
+            first_word = anchors[-1][0] + 1 if anchors else 0
+            frames = voiced_frames[voiced_frames >= previous]
+            if len(frames) == 0:
+                break
+            predicted = self.distribute(words[first_word:], frames)[i - first_word][1]
+            candidates = [
+                pause
+                for pause in pauses
+                if pause[0] >= previous
+                and abs((pause[0] + pause[1]) / 2 - predicted) <= tolerance
+            ]
+            if candidates:
+                pause = min(
+                    candidates, key=lambda p: abs((p[0] + p[1]) / 2 - predicted)
+                )
+                anchors.append((i, pause))
+                previous = pause[1]
+
+        # second pass, phrase by phrase between the anchored pauses
+        spans = []
+        first_word = 0
+        first_frame = 0
+        for i, pause in anchors + [(len(words) - 1, (len(voiced), len(voiced)))]:
+            frames = voiced_frames[
+                (voiced_frames >= first_frame) & (voiced_frames < pause[0])
+            ]
+            if len(frames) == 0:
+                frames = np.array([min(first_frame, len(voiced) - 1)])
+            spans.extend(self.distribute(words[first_word : i + 1], frames))
+            first_word = i + 1
+            first_frame = pause[1]
+
+        confidence = len(anchors) / len(boundaries) if boundaries else 0.5
+        speech_seconds = len(voiced_frames) * self.hop
+        words_per_second = len(words) / speech_seconds
+        if contrast < 10 or not 0.8 <= words_per_second <= 6:
+            # no clear pauses, or the script does not fit the speech
+            confidence = 0.0
+
+        aligned = [
+            {
+                "word": " " + word,
+                "start": round(start * self.hop, 3),
+                "end": round(end * self.hop, 3),
+                "probability": confidence,
+            }
+            for word, (start, end) in zip(words, spans)
+        ]
+        self.last_timings = {"align": time.perf_counter() - start_time}
+        print(
+            f"aligned {len(words)} words in {self.last_timings['align']:.2f}s, "
+            f"confidence {confidence:.2f}"
+        )
+        return aligned, confidence
@@ -1,9 +1,36 @@
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from langchain_community.llms import Clarifai
+import asyncio
+import functools
 import os
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
 from langchain_core.output_parsers import StrOutputParser
+from .client_pool import ClientPool, SharedModel
+from .json_stream import JSONStreamAssembler
+from ..cache.disk_cache import default_cache_dir, hash_key
+from ..cache.sqlite_cache import SQLiteCache
+
+
+def shared_llm(llm):
+    """
+    Makes a langchain Clarifai LLM safe to share between threads.
+
+    The LLM predicts with one clarifai Model, which keeps the inference
+    params of the last call, see SharedModel.
+
+    Args:
+        llm (Clarifai): The langchain LLM.
+
+    Returns:
+        Clarifai: The same LLM, predicting through a SharedModel.
+    """
+    if getattr(llm, "model", None) is not None:
+        llm.model = SharedModel(llm.model)
+    return llm
 
 
 class TextAI:
@@ -13,6 +40,10 @@ class TextAI:
         app_id="chat-completion",
         model_id="GPT-3_5-turbo",
         model_version_id="5d7a50b44aec4a01a9c492c5a5fcf387",
+        use_cache=False,
+        cache_path=None,
+        cache_ttl=7 * 24 * 3600,
+        max_concurrency=8,
     ):
         """
         Initialize the TextAI class.
@@ -22,27 +53,60 @@ class TextAI:
             app_id (str): App ID for Clarifai API.
             model_id (str): Model ID for Clarifai API.
             model_version_id (str): Model Version ID for Clarifai API.
+            use_cache (bool): Whether identical prompts reuse the stored response (default: False).
+            cache_path (str): SQLite file of the response cache, None for llm.sqlite in the
+                noobies_ai cache directory (default: None).
+            cache_ttl (float): Seconds a cached response stays valid (default: 7 days).
+            max_concurrency (int): Maximum number of requests this instance has in flight, across
+                predict, apredict and predict_many (default: 8).
         """
         self.user_id = user_id
         self.app_id = app_id
         self.model_id = model_id
         self.model_version_id = model_version_id
-        self.llm = Clarifai(
+        # shared with every other TextAI of the same model
+        self.llm = ClientPool.get(
+            "langchain",
+            lambda: shared_llm(
+                Clarifai(
+                    user_id=self.user_id,
+                    app_id=self.app_id,
+                    model_id=self.model_id,
+                )
+            ),
             user_id=self.user_id,
             app_id=self.app_id,
             model_id=self.model_id,
         )
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.cache = None
+        if use_cache:
+            self.cache = SQLiteCache(
+                cache_path or default_cache_dir("llm.sqlite"), ttl=cache_ttl
+            )
 
-    def predict(self, prompt_template, **kwargs):
+    def cache_stats(self):
         """
-        Generate a prediction using the given prompt template and input variables.
+        Returns the statistics of the response cache.
+
+        Returns:
+            dict: See SQLiteCache.stats, None when the cache is off.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.stats()
+
+    def _prepare(self, prompt_template, kwargs, max_tokens=None):
+        """
+        Builds the prompt, its inputs, the inference parameters and the cache key.
 
         Args:
             prompt_template (dict): Prompt template containing the template and input variables.
-            **kwargs: Input variables as keyword arguments.
+            kwargs (dict): Input variables.
+            max_tokens (int): Output token limit, None for 1024 (default: None).
 
         Returns:
-            dict: Prediction generated by the model.
+            tuple: (PromptTemplate, inputs, inference params, cache key or None).
         """
         prompt = PromptTemplate(
             template=prompt_template["template"],
@@ -53,23 +117,260 @@ class TextAI:
         for variable in input_variables:
             inputs[variable] = kwargs[variable]
 
+        params = dict(max_tokens=max_tokens or 1024)
+        key = None
+        if self.cache is not None:
+            key = hash_key(
+                "llm",
+                self.user_id,
+                self.app_id,
+                self.model_id,
+                prompt.format(**inputs),
+                params,
+            )
+        return prompt, inputs, params, key
+
+    def predict(
+        self, prompt_template, max_tokens=None, until=None, cache_if=None, **kwargs
+    ):
+        """
+        Generate a prediction using the given prompt template and input variables.
+
+        Args:
+            prompt_template (dict): Prompt template containing the template and input variables.
+            max_tokens (int, optional): Output token limit, None for 1024. Defaults to None.
+            until (callable, optional): When given, the response is streamed and stopped
+                early, see stream. Defaults to None.
+            cache_if (callable, optional): Called with the response, which is only cached
+                when it returns True, e.g. OutputParser.accepts, so a response that cannot be
+                used is generated again next time. Defaults to None, always cached.
+            **kwargs: Input variables as keyword arguments.
+
+        Returns:
+            dict: Prediction generated by the model.
+        """
+        if until is not None:
+            return "".join(
+                self.stream(
+                    prompt_template,
+                    max_tokens=max_tokens,
+                    until=until,
+                    cache_if=cache_if,
+                    **kwargs,
+                )
+            )
+        prompt, inputs, params, key = self._prepare(prompt_template, kwargs, max_tokens)
+
         print("Generating prediction")
         print("Prompt: " + prompt.template)
         try:
-            params = dict(max_tokens=1024)
+            if key is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    print("Response reused from cache")
+                    return cached
             chain = LLMChain(
                 prompt=prompt,
                 llm=self.llm,
                 llm_kwargs={"inference_params": params},
                 output_parser=StrOutputParser(),
             )
-            blog_text = chain.invoke(inputs)
+            with self.slots:
+                blog_text = chain.invoke(inputs)
             blog_text = StrOutputParser().parse(text=blog_text["text"])
+            if key is not None and (cache_if is None or cache_if(blog_text)):
+                self.cache.put(key, blog_text)
             return blog_text
         except Exception as e:
             print(e)
             raise Exception("Error occurred during prediction: " + str(e))
 
+    async def apredict(self, prompt_template, **kwargs):
+        """
+        Asynchronous predict, run in the default executor of the event loop.
+
+        Args:
+            prompt_template (dict): Prompt template containing the template and input variables.
+            **kwargs: Input variables as keyword arguments.
+
+        Returns:
+            str: Prediction generated by the model.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.predict, prompt_template, **kwargs)
+        )
+
+    def predict_many(self, prompt_template, list_of_kwargs, concurrency=4):
+        """
+        Generate several predictions concurrently with the same client.
+
+        A failed prediction does not stop the others, its error is returned
+        in its place instead.
+
+        Args:
+            prompt_template (dict): Prompt template containing the template and input variables.
+            list_of_kwargs (list): Input variables of each prediction, as dicts.
+            concurrency (int): Maximum number of predictions in flight (default: 4).
+
+        Returns:
+            list: (prediction, None) or (None, exception) for each input, in input order.
+        """
+
+        def run(kwargs):
+            try:
+                return self.predict(prompt_template, **kwargs), None
+            except Exception as e:
+                return None, e
+
+        if not list_of_kwargs:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            return list(executor.map(run, list_of_kwargs))
+
+    def _generate(self, text, params):
+        """
+        Yields the chunks of a prediction as the model writes them.
+
+        The langchain LLM only predicts whole responses, so the clarifai SDK
+        streams instead (Model.generate_by_bytes, clarifai 10.11 or later).
+        When the SDK or the model cannot stream, the request is sent again
+        through the LLM and its response is a single chunk.
+
+        Args:
+            text (str): The prompt.
+            params (dict): The inference parameters.
+
+        Yields:
+            str: The next chunk of the response.
+        """
+        generate = getattr(getattr(self.llm, "model", None), "generate_by_bytes", None)
+        if generate is not None:
+            received = ""
+            responses = None
+            try:
+                responses = generate(
+                    text.encode(), input_type="text", inference_params=params
+                )
+                for response in responses:
+                    chunk = response.outputs[0].data.text.raw
+                    if received and chunk.startswith(received):
+                        # some models send the whole text so far every time
+                        chunk = chunk[len(received) :]
+                    received += chunk
+                    if chunk:
+                        yield chunk
+                return
+            except Exception as e:
+                if received:
+                    raise
+                print(f"Streaming not available, predicting the whole response: {e}")
+            finally:
+                if responses is not None:
+                    responses.close()
+        yield from self.llm.stream(text, inference_params=params)
+
+    def _produce(self, text, params, queue, stop):
+        """
+        Runs a streamed prediction in its own thread, see stream.
+
+        The chunks, then an exception if the prediction failed, then None are
+        put on the queue. The prediction holds a slot until it ends or stop is
+        set, whatever the consumer of the queue is doing.
+        """
+        try:
+            with self.slots:
+                chunks = self._generate(text, params)
+                try:
+                    for chunk in chunks:
+                        queue.put(chunk)
+                        if stop.is_set():
+                            break
+                finally:
+                    # closing the stream cancels the request
+                    chunks.close()
+        except Exception as e:
+            queue.put(e)
+        finally:
+            queue.put(None)
+
+    def stream(
+        self, prompt_template, max_tokens=None, until=None, cache_if=None, **kwargs
+    ):
+        """
+        Generate a prediction, yielding the text as it arrives.
+
+        Models that do not stream, or a clarifai SDK older than 10.11, yield
+        the whole response as one chunk. A cached response is yielded as one
+        chunk too, and the joined text is cached once the stream ends.
+
+        Args:
+            prompt_template (dict): Prompt template containing the template and input variables.
+            max_tokens (int, optional): Output token limit, None for 1024. Defaults to None.
+            until (callable, optional): Called with the parsed document once the first JSON
+                value of the response is complete. When it returns True the generation is
+                stopped there, so commentary after the document is never generated.
+                Defaults to None.
+            cache_if (callable, optional): Called with the joined response, see predict.
+                Defaults to None, always cached.
+            **kwargs: Input variables as keyword arguments.
+
+        Yields:
+            str: The next chunk of the response.
+        """
+        prompt, inputs, params, key = self._prepare(prompt_template, kwargs, max_tokens)
+
+        print("Streaming prediction")
+        print("Prompt: " + prompt.template)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                print("Response reused from cache")
+                yield cached
+                return
+        chunks = []
+        # tracks the braces of the response to notice the end of the document
+        assembler = JSONStreamAssembler(max_depth=0) if until is not None else None
+        # the request runs in its own thread, so no slot is held while the
+        # caller works on a chunk or abandons this generator
+        queue = Queue()
+        stop = threading.Event()
+        threading.Thread(
+            target=self._produce,
+            args=(prompt.format(**inputs), params, queue, stop),
+            daemon=True,
+        ).start()
+        try:
+            while True:
+                chunk = queue.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    print(chunk)
+                    raise Exception("Error occurred during prediction: " + str(chunk))
+                chunks.append(chunk)
+                yield chunk
+                if assembler is None:
+                    continue
+                try:
+                    assembler.feed(chunk)
+                except Exception as e:
+                    # the whole text still reaches the caller's parser
+                    print(f"Stopped tracking the JSON document: {e}")
+                    assembler = None
+                    continue
+                if not assembler.done:
+                    continue
+                if assembler.root is not None and until(assembler.root):
+                    print("Complete document received, generation stopped")
+                    break
+                assembler = None
+        finally:
+            stop.set()
+        text = "".join(chunks)
+        if key is not None and (cache_if is None or cache_if(text)):
+            self.cache.put(key, text)
+
 
 if __name__ == "__main__":
     from prompt.text_prompt import GENERATE_BLOG_FROM_BLOG
@@ -89,3 +390,20 @@ if __name__ == "__main__":
         print(prediction)
     except Exception as e:
         print("Error occurred: " + str(e))
+
+    # bulk generation, one client and at most 4 requests in flight
+    topics = ["Python generators", "Rust ownership", "Go channels", "SQL indexes"]
+    results = text_ai.predict_many(
+        GENERATE_BLOG_FROM_BLOG,
+        [
+            {
+                "topic": topic,
+                "syntax": HUGO,
+                "date": datetime.datetime.now().strftime("%Y-%m-%d"),
+            }
+            for topic in topics
+        ],
+        concurrency=4,
+    )
+    for topic, (prediction, error) in zip(topics, results):
+        print(topic, "failed: " + str(error) if error else len(prediction))
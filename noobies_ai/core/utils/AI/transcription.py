@@ -0,0 +1,193 @@
+from .model_registry import ModelRegistry
+import os
+import time
+
+DEFAULT_ENGINE = "whisper"
+
+
+class TranscriptionEngine:
+    """
+    Base class of the speech to text engines used for word timestamps.
+
+    Engines return words as dicts with "word", "start", "end" and
+    "probability" keys, the format of openai-whisper. Models are loaded
+    through ModelRegistry, so they are shared by the whole process.
+    """
+
+    name = None
+
+    def __init__(self, model_name="base.en"):
+        """
+        Initializes the TranscriptionEngine class.
+
+        Args:
+            model_name (str): Name of the model (default: "base.en").
+        """
+        self.model_name = model_name
+        self.key = f"{self.name}/{model_name}"
+        self.last_timings = None
+
+    def load(self):
+        """Loads the model, called once per process by the registry."""
+        raise NotImplementedError
+
+    def words(self, model, audio_path, word_timestamps):
+        """Runs the model and returns the words."""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """
+        Loads the model in a background thread.
+
+        Returns:
+            threading.Thread: The loading thread, None if the model is loaded or loading.
+        """
+        return ModelRegistry.warm_up(self.key, self.load)
+
+    def transcribe(self, audio_path, word_timestamps=True):
+        """
+        Transcribes an audio file.
+
+        The time spent waiting for the model and the time spent transcribing
+        are printed and kept in last_timings.
+
+        Args:
+            audio_path (str): The path to the audio file.
+            word_timestamps (bool): Whether to include word timestamps (default: True).
+
+        Returns:
+            list: Words as dicts with "word", "start", "end" and "probability" keys.
+        """
+        start = time.perf_counter()
+        model = ModelRegistry.get(self.key, self.load)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        # models keep decoding state, so one transcription at a time
+        with ModelRegistry.lock(self.key):
+            words = self.words(model, audio_path, word_timestamps)
+        transcribe_time = time.perf_counter() - start
+        self.last_timings = {"load": load_time, "transcribe": transcribe_time}
+        print(f"{self.key}: load {load_time:.2f}s, transcribe {transcribe_time:.2f}s")
+        return words
+
+
+class WhisperEngine(TranscriptionEngine):
+    """openai-whisper running in fp32 with PyTorch."""
+
+    name = "whisper"
+
+    def load(self):
+        # imported lazily since whisper pulls in torch
+        import whisper
+
+        return whisper.load_model(self.model_name)
+
+    def words(self, model, audio_path, word_timestamps):
+        result = model.transcribe(audio_path, word_timestamps=word_timestamps)
+        words = []
+        for res in result["segments"]:
+            words.extend(res.get("words", []))
+        return words
+
+
+class FasterWhisperEngine(TranscriptionEngine):
+    """
+    faster-whisper, the Whisper models on CTranslate2, int8 quantized on CPU.
+
+    Needs the optional faster-whisper package.
+    """
+
+    name = "faster-whisper"
+
+    def __init__(self, model_name="base.en", compute_type="int8", cpu_threads=0):
+        """
+        Initializes the FasterWhisperEngine class.
+
+        Args:
+            model_name (str): Name of the model (default: "base.en").
+            compute_type (str): CTranslate2 compute type (default: "int8").
+            cpu_threads (int): Number of threads, 0 for the CTranslate2 default (default: 0).
+        """
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        super().__init__(model_name)
+        self.key = f"{self.name}/{model_name}/{compute_type}"
+
+    def load(self):
+        from faster_whisper import WhisperModel
+
+        return WhisperModel(
+            self.model_name,
+            device="cpu",
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads,
+        )
+
+    def words(self, model, audio_path, word_timestamps):
+        segments, _ = model.transcribe(audio_path, word_timestamps=word_timestamps)
+        words = []
+        # segments is a generator, transcription happens while iterating
+        for segment in segments:
+            for word in segment.words or []:
+                words.append(
+                    {
+                        "word": word.word,
+                        "start": word.start,
+                        "end": word.end,
+                        "probability": word.probability,
+                    }
+                )
+        return words
+
+
+ENGINES = {
+    WhisperEngine.name: WhisperEngine,
+    FasterWhisperEngine.name: FasterWhisperEngine,
+}
+
+
+def get_engine(engine=None, **kwargs):
+    """
+    Returns a transcription engine.
+
+    Args:
+        engine (str, optional): Name of the engine in ENGINES. Defaults to the
+            NOOBIES_TRANSCRIPTION_ENGINE environment variable, then "whisper".
+        **kwargs: Passed to the engine, e.g. model_name.
+
+    Returns:
+        TranscriptionEngine: The engine.
+    """
+    engine = engine or os.environ.get("NOOBIES_TRANSCRIPTION_ENGINE", DEFAULT_ENGINE)
+    if engine not in ENGINES:
+        raise ValueError(
+            f"Unknown transcription engine {engine}, expected one of {list(ENGINES)}"
+        )
+    return ENGINES[engine](**kwargs)
+
+
+if __name__ == "__main__":
+    import sys
+    from moviepy.editor import AudioFileClip
+
+    # real-time factor (transcription time / audio duration) of every engine
+    audio_path = (
+        sys.argv[1] if len(sys.argv) > 1 else "static/videos/noobies_intro.webm"
+    )
+    audio = AudioFileClip(audio_path)
+    duration = audio.duration
+    audio.close()
+
+    for name in ENGINES:
+        engine = get_engine(name)
+        try:
+            engine.transcribe(audio_path)
+        except ImportError as e:
+            print(f"{name}: not installed ({e})")
+            continue
+        timings = engine.last_timings
+        print(
+            f"{name}: load {timings['load']:.2f}s, "
+            f"transcribe {timings['transcribe']:.2f}s, "
+            f"RTF {timings['transcribe'] / duration:.3f}"
+        )
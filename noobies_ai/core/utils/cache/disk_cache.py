@@ -0,0 +1,289 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unicodedata
+
+
+def default_cache_dir(name=""):
+    """
+    Returns the directory used for a named on-disk cache.
+
+    The root can be moved with the NOOBIES_CACHE_DIR environment variable.
+
+    Args:
+        name (str): Name of the cache (default: "").
+
+    Returns:
+        str: The cache directory.
+    """
+    root = os.environ.get(
+        "NOOBIES_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "noobies_ai"),
+    )
+    return os.path.join(root, name)
+
+
+def hash_key(*parts):
+    """
+    Builds a cache key from bytes and JSON serializable parts.
+
+    Args:
+        *parts: Values that identify the cached entry.
+
+    Returns:
+        str: A sha256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, default=str).encode()
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def hash_file(path, chunk_size=1024**2):
+    """
+    Hashes the content of a file without reading it into memory at once.
+
+    Args:
+        path (str): Path of the file.
+        chunk_size (int): Bytes read at a time (default: 1 MB).
+
+    Returns:
+        str: A sha256 hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_text(text):
+    """
+    Normalizes text used in a cache key.
+
+    Unicode is NFKC normalized and case folded, and runs of whitespace are
+    collapsed, so prompts differing only in those respects share an entry.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The normalized text.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def link_or_copy(src_path, dst_path):
+    """
+    Hard links a file to a new path, copying it when linking is not possible.
+
+    Whatever was at dst_path is replaced. Files linked out of a cache must
+    only be replaced, never written in place, or the cache entry changes
+    with them.
+
+    Args:
+        src_path (str): The existing file.
+        dst_path (str): The new path.
+
+    Returns:
+        str: dst_path.
+    """
+    tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src_path, tmp_path)
+    except OSError:
+        # other file system, or links not supported
+        shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, dst_path)
+    return dst_path
+
+
+class DiskCache:
+    """
+    Content-addressed file cache with size-bounded LRU eviction.
+
+    Entries are files named after their key. Writes go through a temporary
+    file and an atomic rename, so several processes can share one directory.
+    The modification time of an entry is refreshed on every hit and used as
+    its last access time for eviction. Hits and misses of the instance are
+    counted, see stats.
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024**3, suffix=""):
+        """
+        Initializes the DiskCache class.
+
+        Args:
+            cache_dir (str): Directory holding the cache entries.
+            max_bytes (int): Size limit of the cache directory (default: 2 GB).
+            suffix (str): File extension of the entries, e.g. ".mp4" (default: "").
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, cache_dir, max_bytes=2 * 1024**3, suffix=""):
+        """
+        Returns the DiskCache of a directory, created once per process.
+
+        Sharing the instance lets hit and miss counts add up across callers.
+
+        Args:
+            cache_dir (str): Directory holding the cache entries.
+            max_bytes (int): Size limit of the cache directory (default: 2 GB).
+            suffix (str): File extension of the entries, e.g. ".mp4" (default: "").
+
+        Returns:
+            DiskCache: The cache.
+        """
+        with cls._shared_lock:
+            if cache_dir not in cls._shared:
+                cls._shared[cache_dir] = cls(cache_dir, max_bytes, suffix)
+            return cls._shared[cache_dir]
+
+    def path(self, key):
+        """Returns the path of the entry for the given key."""
+        return os.path.join(self.cache_dir, key[:2], key + self.suffix)
+
+    def get(self, key):
+        """
+        Looks up an entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: Path of the cached file, or None on a miss.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return path
+
+    def put(self, key, src_path, move=False):
+        """
+        Stores a file in the cache.
+
+        Args:
+            key (str): The cache key.
+            src_path (str): File to store.
+            move (bool): Move the file instead of copying it (default: False).
+
+        Returns:
+            str: Path of the cached file.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            if move:
+                shutil.move(src_path, tmp_path)
+            else:
+                shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def put_bytes(self, key, data):
+        """
+        Stores bytes in the cache.
+
+        Args:
+            key (str): The cache key.
+            data (bytes): Content of the entry.
+
+        Returns:
+            str: Path of the cached file.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def stats(self):
+        """
+        Returns the hit and miss counts of this instance.
+
+        Returns:
+            dict: "hits", "misses" and "hit_rate" (None before the first lookup).
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+    def entries(self):
+        """Returns (mtime, size, path) of every entry in the cache."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        """Returns the total size of the cache in bytes."""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        with self.lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
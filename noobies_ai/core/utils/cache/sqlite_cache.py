@@ -0,0 +1,234 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteCache:
+    """
+    Small key/value cache for text in a local SQLite file.
+
+    The database runs in WAL mode and lookups only read, so readers never
+    wait for a writer and several processes can share the file. Entries
+    expire after ttl seconds and the least recently used ones are evicted
+    when the cache holds more than max_entries entries or max_bytes bytes
+    of values. Hit, miss, expiry and eviction counts are kept in the
+    database itself, so they add up across processes and restarts; the
+    counts and access times of lookups are gathered in memory and written
+    in one batch with the next put, the next stats call or every
+    flush_every lookups.
+    """
+
+    def __init__(
+        self,
+        path,
+        ttl=7 * 24 * 3600,
+        max_entries=10000,
+        max_bytes=64 * 1024**2,
+        flush_every=100,
+    ):
+        """
+        Initializes the SQLiteCache class.
+
+        Args:
+            path (str): Path of the SQLite file.
+            ttl (float): Seconds an entry stays valid, None for no expiry (default: 7 days).
+            max_entries (int): Maximum number of entries (default: 10000).
+            max_bytes (int): Maximum total size of the values in bytes (default: 64 MB).
+            flush_every (int): Lookups gathered in memory before they are written (default: 100).
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        # lookups not written yet, counter name -> count and key -> (accessed, hits)
+        self._counts = {}
+        self._accessed = {}
+        self._lookups = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = self._connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL, "
+                "hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _connect(self):
+        """Opens a connection, one per call so the cache can be used from any thread."""
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA busy_timeout=30000")
+        return db
+
+    def _count(self, db, name, n=1):
+        """Adds n to a counter."""
+        db.execute(
+            "INSERT INTO counters(name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, n),
+        )
+
+    def _record(self, name, key=None, now=None):
+        """Counts a lookup in memory, returns True when the batch should be written."""
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + 1
+            if key is not None:
+                hits = self._accessed.get(key, (now, 0))[1]
+                self._accessed[key] = (now, hits + 1)
+            self._lookups += 1
+            return self._lookups >= self.flush_every
+
+    def _flush(self, db):
+        """Writes the lookups gathered in memory, within the transaction of db."""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            accessed, self._accessed = self._accessed, {}
+            self._lookups = 0
+        for name, n in counts.items():
+            self._count(db, name, n)
+        db.executemany(
+            "UPDATE entries SET accessed = MAX(accessed, ?), hits = hits + ? "
+            "WHERE key = ?",
+            [(when, hits, key) for key, (when, hits) in accessed.items()],
+        )
+
+    def flush(self):
+        """Writes the counts and access times of the lookups gathered in memory."""
+        db = self._connect()
+        try:
+            with db:
+                self._flush(db)
+        finally:
+            db.close()
+
+    def get(self, key):
+        """
+        Looks up an entry, without writing to the database.
+
+        An expired entry is a miss and is removed by the next put.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: The cached value, or None on a miss.
+        """
+        now = time.time()
+        db = self._connect()
+        try:
+            row = db.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            db.close()
+        if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+            row = None
+        if row is None:
+            flush = self._record("misses")
+        else:
+            flush = self._record("hits", key, now)
+        if flush:
+            self.flush()
+        return row[0] if row is not None else None
+
+    def put(self, key, value):
+        """
+        Stores an entry, then evicts entries over the limits.
+
+        Args:
+            key (str): The cache key.
+            value (str): The value.
+        """
+        now = time.time()
+        db = self._connect()
+        try:
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO entries(key, value, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode("utf-8")), now, now),
+                )
+                # eviction needs the latest access times
+                self._flush(db)
+                self._evict(db, now)
+        finally:
+            db.close()
+
+    def _evict(self, db, now):
+        """Removes expired entries, then the least recently used ones over the limits."""
+        if self.ttl is not None:
+            expired = db.execute(
+                "DELETE FROM entries WHERE created < ?", (now - self.ttl,)
+            ).rowcount
+            if expired:
+                self._count(db, "expired", expired)
+        count, total = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in db.execute(
+            "SELECT key, size FROM entries ORDER BY accessed"
+        ).fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            evicted += 1
+        self._count(db, "evicted", evicted)
+
+    def clear(self):
+        """Removes every entry, the counters are kept."""
+        db = self._connect()
+        try:
+            with db:
+                db.execute("DELETE FROM entries")
+        finally:
+            db.close()
+
+    def stats(self):
+        """
+        Returns the cache statistics, for capacity planning.
+
+        Returns:
+            dict: "entries", "bytes", "hits", "misses", "expired", "evicted",
+                "hit_rate" (None before the first lookup) and "oldest", the age in
+                seconds of the oldest entry.
+        """
+        self.flush()
+        db = self._connect()
+        try:
+            count, total, oldest = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created) FROM entries"
+            ).fetchone()
+            counters = dict(db.execute("SELECT name, value FROM counters").fetchall())
+        finally:
+            db.close()
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": hits,
+            "misses": misses,
+            "expired": counters.get("expired", 0),
+            "evicted": counters.get("evicted", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+            "oldest": time.time() - oldest if oldest is not None else None,
+        }
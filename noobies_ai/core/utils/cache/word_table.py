@@ -0,0 +1,87 @@
+from collections.abc import Sequence
+import io
+import numpy as np
+
+
+def pack_words(words):
+    """
+    Packs timed words into a compact npz file.
+
+    Timings are stored as float32 columns and the words as a single UTF-8
+    string table with offsets.
+
+    Args:
+        words (list): Words as dicts with "word", "start", "end" and optionally "probability" keys.
+
+    Returns:
+        bytes: Content of the npz file.
+    """
+    encoded = [word["word"].encode("utf-8") for word in words]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(text) for text in encoded])
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        start=np.array([word["start"] for word in words], dtype=np.float32),
+        end=np.array([word["end"] for word in words], dtype=np.float32),
+        probability=np.array(
+            [word.get("probability", np.nan) for word in words], dtype=np.float32
+        ),
+        text=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        offsets=offsets,
+    )
+    return buffer.getvalue()
+
+
+class WordTable(Sequence):
+    """
+    Read-only list of timed words backed by an npz file written by pack_words.
+
+    Nothing is read before the first access. Items are built on demand as
+    dicts with "word", "start", "end" and "probability" keys, like the
+    output of the transcription engines.
+    """
+
+    def __init__(self, path):
+        """
+        Initializes the WordTable class.
+
+        Args:
+            path (str): Path of the npz file.
+        """
+        self.path = path
+        self._columns = None
+
+    def _load(self):
+        """Reads the columns, once."""
+        if self._columns is None:
+            with np.load(self.path) as data:
+                self._columns = {name: data[name] for name in data.files}
+        return self._columns
+
+    def __len__(self):
+        return len(self._load()["start"])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        columns = self._load()
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("word index out of range")
+        offsets = columns["offsets"]
+        text = columns["text"][offsets[index] : offsets[index + 1]]
+        word = {
+            "word": text.tobytes().decode("utf-8"),
+            # float32 keeps about 7 digits, milliseconds are all that matter
+            "start": round(float(columns["start"][index]), 3),
+            "end": round(float(columns["end"][index]), 3),
+        }
+        probability = float(columns["probability"][index])
+        if not np.isnan(probability):
+            word["probability"] = round(probability, 4)
+        return word
+
+    def __repr__(self):
+        return f"WordTable({self.path!r})"
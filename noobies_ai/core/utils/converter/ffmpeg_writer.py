@@ -0,0 +1,138 @@
+from imageio_ffmpeg import get_ffmpeg_exe
+import numpy as np
+import subprocess
+
+
+class FFmpegPipeWriter:
+    """
+    Encodes raw RGB frames by piping them straight into an ffmpeg process.
+    """
+
+    def __init__(
+        self,
+        output_file,
+        size,
+        fps=24,
+        audio_file=None,
+        codec="libx264",
+        audio_codec="aac",
+        preset="medium",
+        threads=None,
+        ffmpeg_params=None,
+    ):
+        """
+        Initializes the FFmpegPipeWriter class.
+
+        Args:
+            output_file (str): Path of the encoded video file.
+            size (tuple): Frame size as (width, height).
+            fps (int): Frames per second (default: 24).
+            audio_file (str): Audio file muxed into the output, if any (default: None).
+            codec (str): Video codec (default: "libx264").
+            audio_codec (str): Audio codec (default: "aac").
+            preset (str): Encoder preset (default: "medium").
+            threads (int): Number of encoder threads, ffmpeg decides if None (default: None).
+            ffmpeg_params (list): Extra output options passed to ffmpeg (default: None).
+        """
+        self.output_file = output_file
+        self.width, self.height = size
+        self.fps = fps
+        self.audio_file = audio_file
+        self.codec = codec
+        self.audio_codec = audio_codec
+        self.preset = preset
+        self.threads = threads
+        self.ffmpeg_params = ffmpeg_params or []
+        self.buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.proc = None
+
+    def command(self):
+        """Returns the ffmpeg command line of the writer."""
+        cmd = [
+            get_ffmpeg_exe(),
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-vcodec",
+            "rawvideo",
+            "-s",
+            f"{self.width}x{self.height}",
+            "-pix_fmt",
+            "rgb24",
+            "-r",
+            str(self.fps),
+            "-i",
+            "-",
+        ]
+        if self.audio_file is not None:
+            cmd += ["-i", self.audio_file, "-map", "0:v", "-map", "1:a"]
+        cmd += [
+            "-vcodec",
+            self.codec,
+            "-preset",
+            self.preset,
+            "-pix_fmt",
+            "yuv420p",
+        ]
+        if self.threads is not None:
+            cmd += ["-threads", str(self.threads)]
+        if self.audio_file is not None:
+            cmd += ["-acodec", self.audio_codec, "-shortest"]
+        cmd += self.ffmpeg_params
+        cmd.append(self.output_file)
+        return cmd
+
+    def open(self):
+        """Starts the ffmpeg process."""
+        self.proc = subprocess.Popen(
+            self.command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        return self
+
+    def write_frame(self, frame):
+        """
+        Sends one frame to ffmpeg.
+
+        Frames that are already contiguous uint8 arrays of the right shape are
+        written without copying, anything else goes through the preallocated
+        frame buffer.
+
+        Args:
+            frame (np.ndarray): The frame as a (height, width, 3) array.
+        """
+        if (
+            frame.dtype != np.uint8
+            or frame.shape != self.buffer.shape
+            or not frame.flags.c_contiguous
+        ):
+            np.copyto(self.buffer, frame, casting="unsafe")
+            frame = self.buffer
+        self.proc.stdin.write(memoryview(frame).cast("B"))
+
+    def close(self):
+        """Flushes the pipe and waits for ffmpeg to finish."""
+        if self.proc is None:
+            return
+        self.proc.stdin.close()
+        error = self.proc.stderr.read().decode(errors="ignore")
+        returncode = self.proc.wait()
+        self.proc = None
+        if returncode != 0:
+            raise IOError(f"ffmpeg failed writing {self.output_file}: {error}")
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+            return False
+        self.close()
+        return False
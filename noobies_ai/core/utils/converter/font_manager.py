@@ -0,0 +1,176 @@
+from ..cache.disk_cache import default_cache_dir
+import json
+import os
+import re
+import sys
+import threading
+
+STATIC_FONTS = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "static", "fonts")
+)
+DEFAULT_FONT = os.path.join(STATIC_FONTS, "Corben-Bold.ttf")
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+
+
+def system_font_dirs():
+    """Returns the usual font directories of the current platform."""
+    home = os.path.expanduser("~")
+    if sys.platform == "darwin":
+        return [
+            "/System/Library/Fonts",
+            "/Library/Fonts",
+            os.path.join(home, "Library", "Fonts"),
+        ]
+    if sys.platform == "win32":
+        return [os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts")]
+    return [
+        "/usr/share/fonts",
+        "/usr/local/share/fonts",
+        os.path.join(home, ".fonts"),
+        os.path.join(home, ".local", "share", "fonts"),
+    ]
+
+
+def normalize(name):
+    """Lowercases a font name and drops everything but letters and digits."""
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+class FontManager:
+    """
+    Discovers font files once and keeps the result cached.
+
+    The font list is kept in memory for the whole process and in a JSON file
+    on disk. Both are invalidated when the modification time of a font
+    directory (or of one of its sub directories) changes.
+    """
+
+    _fonts = None
+    _signature = None
+    _lock = threading.Lock()
+
+    def __init__(self, font_dirs=None, cache_file=None):
+        """
+        Initializes the FontManager class.
+
+        Args:
+            font_dirs (list, optional): Directories to scan. Defaults to static/fonts
+                followed by the system font directories.
+            cache_file (str, optional): JSON file the font list is cached in. Defaults to
+                fonts.json in the noobies_ai cache directory.
+        """
+        self.font_dirs = font_dirs or [STATIC_FONTS] + system_font_dirs()
+        self.cache_file = cache_file or default_cache_dir("fonts.json")
+
+    def signature(self):
+        """
+        Returns the modification times of the font directories.
+
+        Only the directories themselves and their direct sub directories are
+        looked at, which is enough to notice installed or removed fonts.
+        """
+        signature = []
+        for font_dir in self.font_dirs:
+            if not os.path.isdir(font_dir):
+                continue
+            signature.append([font_dir, os.stat(font_dir).st_mtime])
+            for entry in os.scandir(font_dir):
+                if entry.is_dir():
+                    signature.append([entry.path, entry.stat().st_mtime])
+        return signature
+
+    def scan(self):
+        """
+        Scans the font directories.
+
+        Returns:
+            dict: Font names (file names without extension) mapped to font paths.
+        """
+        fonts = {}
+        for font_dir in self.font_dirs:
+            for root, _, files in os.walk(font_dir):
+                for name in sorted(files):
+                    if name.lower().endswith(FONT_EXTENSIONS):
+                        # the first directory wins, so static/fonts shadows system fonts
+                        fonts.setdefault(
+                            os.path.splitext(name)[0], os.path.join(root, name)
+                        )
+        return fonts
+
+    def _load_cache(self, signature):
+        """Returns the font list cached on disk, or None if it is stale."""
+        try:
+            with open(self.cache_file, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("signature") != signature:
+            return None
+        return cached.get("fonts")
+
+    def _save_cache(self, signature, fonts):
+        """Writes the font list to disk, atomically."""
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w") as f:
+                json.dump({"signature": signature, "fonts": fonts}, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            print(f"Error caching font list: {e}")
+
+    def get_fonts(self):
+        """
+        Returns the available fonts.
+
+        Returns:
+            dict: Font names mapped to font paths.
+        """
+        signature = self.signature()
+        with FontManager._lock:
+            if FontManager._signature == signature:
+                return FontManager._fonts
+            fonts = self._load_cache(signature)
+            if fonts is None:
+                fonts = self.scan()
+                self._save_cache(signature, fonts)
+            FontManager._fonts = fonts
+            FontManager._signature = signature
+            return fonts
+
+    def list_fonts(self):
+        """Returns the sorted names of the available fonts."""
+        return sorted(self.get_fonts())
+
+    def resolve(self, font):
+        """
+        Finds the file of a font.
+
+        Accepts paths, exact font names ("Corben-Bold") and loose names such
+        as ImageMagick's "liberation-sans", which picks the first font whose
+        normalized name starts with it.
+
+        Args:
+            font (str): Font path or name.
+
+        Returns:
+            str: Path of the font file, or None if nothing matches.
+        """
+        if not font:
+            return None
+        if os.path.isfile(font):
+            return font
+        fonts = self.get_fonts()
+        if font in fonts:
+            return fonts[font]
+        wanted = normalize(os.path.splitext(font)[0])
+        if not wanted:
+            return None
+        matches = sorted(
+            ("regular" not in name.lower(), len(name), name)
+            for name in fonts
+            if normalize(name).startswith(wanted)
+        )
+        if matches:
+            return fonts[matches[0][2]]
+        return None
@@ -1,4 +1,8 @@
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import os
+import time
 
 
 class ImageConverter:
@@ -18,10 +22,69 @@ class ImageConverter:
         """
         try:
             for image_path in image_paths:
-                im = Image.open(image_path)
-                im = im.resize(resolution)
-                im.save(image_path)
+                with Image.open(image_path) as im:
+                    image_format = im.format
+                    im = im.resize(resolution)
+                # replaced, not written in place, as the file may be linked to a cache entry
+                tmp_path = f"{image_path}.{os.getpid()}.tmp"
+                im.save(tmp_path, format=image_format)
+                os.replace(tmp_path, image_path)
             return True
         except Exception as e:
             print(f"Error resizing image: {str(e)}")
             return False
+
+    def prepare(self, image_path, size):
+        """
+        Decodes an image once and fits it to a frame size.
+
+        The image is center-cropped to the aspect ratio of size and scaled to
+        exactly size in a single Pillow call, without stretching.
+
+        Args:
+            image_path (str): Path of the image.
+            size (tuple): Target size as (width, height).
+
+        Returns:
+            np.ndarray: A contiguous (height, width, 3) uint8 array.
+        """
+        width, height = size
+        with Image.open(image_path) as im:
+            im = im.convert("RGB")
+            src_width, src_height = im.size
+            if src_width * height > src_height * width:
+                crop_width = src_height * width / height
+                left = (src_width - crop_width) / 2
+                box = (left, 0, left + crop_width, src_height)
+            else:
+                crop_height = src_width * height / width
+                top = (src_height - crop_height) / 2
+                box = (0, top, src_width, top + crop_height)
+            im = im.resize(size, Image.LANCZOS, box=box, reducing_gap=3.0)
+            return np.ascontiguousarray(np.asarray(im, dtype=np.uint8))
+
+    def prepare_all(self, image_paths, sizes, max_workers=None):
+        """
+        Prepares several images concurrently, see prepare.
+
+        Args:
+            image_paths (list): List of image file paths.
+            sizes (list): Target size of each image as (width, height).
+            max_workers (int): Number of threads, decided by the executor if None.
+
+        Returns:
+            tuple: The list of arrays and the list of per-image timings in seconds.
+        """
+
+        def timed_prepare(image_path, size):
+            start = time.perf_counter()
+            array = self.prepare(image_path, size)
+            return array, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(timed_prepare, image_paths, sizes))
+        arrays = [array for array, _ in results]
+        timings = [timing for _, timing in results]
+        for image_path, timing in zip(image_paths, timings):
+            print(f"prepared {image_path} in {timing:.3f}s")
+        return arrays, timings
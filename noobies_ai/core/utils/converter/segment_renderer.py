@@ -0,0 +1,167 @@
+from imageio_ffmpeg import get_ffmpeg_exe
+from .ffmpeg_writer import FFmpegPipeWriter
+from .image_converter import ImageConverter
+from .subtitle_renderer import SubtitleRenderer
+from .zoom_engine import ZoomEngine, zoom_curve, zoom_scales
+from functools import partial
+import subprocess
+
+
+def frame_counts(durations, fps):
+    """
+    Splits a sequence of durations into whole frame counts.
+
+    Boundaries are rounded on the running time, so the total number of
+    frames always matches the total duration no matter how many segments.
+
+    Args:
+        durations (list): Duration of each segment in seconds.
+        fps (int): Frames per second.
+
+    Returns:
+        list: Number of frames of each segment.
+    """
+    counts = []
+    elapsed = 0.0
+    for duration in durations:
+        start = int(round(elapsed * fps))
+        elapsed += duration
+        counts.append(max(1, int(round(elapsed * fps)) - start))
+    return counts
+
+
+def segment_subtitles(subtitles, start, end):
+    """
+    Returns the words shown between start and end, timed from start.
+
+    Args:
+        subtitles (list): Words as dicts with "word", "start" and "end" keys.
+        start (float): Start of the segment in seconds.
+        end (float): End of the segment in seconds.
+
+    Returns:
+        list: The words of the segment.
+    """
+    return [
+        {
+            "word": word["word"],
+            "start": word["start"] - start,
+            "end": word["end"] - start,
+        }
+        for word in subtitles or []
+        if word["end"] > start and word["start"] < end
+    ]
+
+
+def render_segment(
+    image_file,
+    n_frames,
+    output_file,
+    size,
+    fps,
+    zoom_params,
+    encoder=None,
+    threads=1,
+    subtitles=None,
+    subtitle_options=None,
+    subtitle_filter=None,
+):
+    """
+    Encodes a single zoom segment, without audio.
+
+    This is a module level function so it can run in a worker process.
+
+    Args:
+        image_file (str): Path of the source image.
+        n_frames (int): Number of frames of the segment.
+        output_file (str): Path of the encoded segment.
+        size (tuple): Frame size as (width, height).
+        fps (int): Frames per second.
+        zoom_params (dict): Keyword arguments of zoom_curve.
+        encoder (dict): Encoder settings passed to FFmpegPipeWriter, e.g. codec and preset (default: None).
+        threads (int): Number of encoder threads (default: 1).
+        subtitles (list): Words burnt into the segment, timed from the start of the segment (default: None).
+        subtitle_options (dict): Options for the subtitles (default: None).
+        subtitle_filter (str): ffmpeg filter burning an ASS file, used instead of subtitles (default: None).
+
+    Returns:
+        str: The path to the encoded segment.
+    """
+    zoom = partial(zoom_curve, **zoom_params)
+    source_size = ZoomEngine.source_size(size, zoom_scales(n_frames, fps, zoom).max())
+    engine = ZoomEngine(
+        ImageConverter().prepare(image_file, source_size),
+        size=size,
+        duration=n_frames / fps,
+        fps=fps,
+        zoom=zoom,
+    )
+    writer = FFmpegPipeWriter(
+        output_file,
+        size,
+        fps=fps,
+        threads=threads,
+        ffmpeg_params=["-vf", subtitle_filter] if subtitle_filter else None,
+        **(encoder or {}),
+    )
+    renderer = None
+    if subtitles:
+        renderer = SubtitleRenderer(subtitles, subtitle_options or {}, size)
+    with writer:
+        for i, frame in enumerate(engine.frames()):
+            if renderer is not None:
+                frame = renderer.apply(frame, i / fps)
+            writer.write_frame(frame)
+    return output_file
+
+
+def concat_segments(segment_files, audio_file, output_file, list_file):
+    """
+    Joins encoded segments with the ffmpeg concat demuxer and muxes the audio.
+
+    The video stream is copied, only the audio is encoded.
+
+    Args:
+        segment_files (list): Paths of the segments, in order.
+        audio_file (str): Path of the voiceover.
+        output_file (str): Path of the final video.
+        list_file (str): Path where the concat list is written.
+
+    Returns:
+        str: The path to the final video.
+    """
+    with open(list_file, "w") as f:
+        for segment_file in segment_files:
+            escaped = segment_file.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [
+        get_ffmpeg_exe(),
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        list_file,
+        "-i",
+        audio_file,
+        "-map",
+        "0:v",
+        "-map",
+        "1:a",
+        "-c:v",
+        "copy",
+        "-c:a",
+        "aac",
+        "-shortest",
+        output_file,
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise IOError(
+            f"ffmpeg failed joining segments: {result.stderr.decode(errors='ignore')}"
+        )
+    return output_file
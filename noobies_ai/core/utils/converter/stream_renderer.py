@@ -0,0 +1,238 @@
+import glob
+import numpy as np
+import os
+import queue
+import sys
+import threading
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process and of its children.
+
+    The values are high-water marks for the lifetime of the process, the
+    children are the finished subprocesses such as ffmpeg. Use RSSSampler
+    for the peak of a single render.
+
+    Returns:
+        dict: "self" and "children" in bytes, None where the platform cannot tell.
+    """
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    }
+
+
+def _statm_rss(pid):
+    """Returns the current RSS in bytes of a process, None if it cannot be read."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _child_pids(pid="self"):
+    """Returns the PIDs of the running subprocesses of a process, their own included."""
+    pids = set()
+    for path in glob.glob(f"/proc/{pid}/task/*/children"):
+        try:
+            with open(path) as f:
+                pids.update(f.read().split())
+        except OSError:
+            continue
+    # segment workers run ffmpeg themselves
+    for child in list(pids):
+        pids |= _child_pids(child)
+    return pids
+
+
+class RSSSampler:
+    """
+    Samples the RSS of this process and of its subprocesses while running.
+
+    ru_maxrss only reports the high-water mark of the whole process
+    lifetime, so in a long running server every render after the largest
+    one would report the same value. The sampler reads /proc from a thread
+    instead and keeps the peak seen between start and stop. Where /proc is
+    not available, the lifetime marks of peak_rss are reported.
+    """
+
+    def __init__(self, interval=0.05):
+        """
+        Initializes the RSSSampler class.
+
+        Args:
+            interval (float): Seconds between two samples (default: 0.05).
+        """
+        self.interval = interval
+        self.available = _statm_rss("self") is not None
+        self.peaks = {"self": 0, "children": 0}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        """Takes one sample."""
+        rss = _statm_rss("self")
+        if rss is not None:
+            self.peaks["self"] = max(self.peaks["self"], rss)
+        children = sum(filter(None, (_statm_rss(pid) for pid in _child_pids())))
+        self.peaks["children"] = max(self.peaks["children"], children)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        """Starts sampling."""
+        if self.available:
+            self.sample()
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops sampling, can be called more than once.
+
+        Returns:
+            dict: Peak RSS in bytes of this process ("self") and of its subprocesses
+                ("children"), see peak_rss where /proc is not available.
+        """
+        if not self.available:
+            return peak_rss()
+        if not self.stopped.is_set():
+            self.stopped.set()
+            self.thread.join()
+            self.sample()
+        return dict(self.peaks)
+
+
+def plan_memory(size, max_scale, memory_limit, ring_size=8, min_ring_size=2):
+    """
+    Fits the frame ring and the source image of a segment into a memory ceiling.
+
+    The ring is shrunk first, down to min_ring_size, then the scale of the
+    source image is lowered, down to the frame size itself.
+
+    Args:
+        size (tuple): Frame size as (width, height).
+        max_scale (float): Largest relative zoom factor of the segments.
+        memory_limit (int): Ceiling in bytes for the frame data held in Python.
+        ring_size (int): Wanted number of frame buffers (default: 8).
+        min_ring_size (int): Smallest number of frame buffers (default: 2).
+
+    Returns:
+        tuple: (ring_size, source_scale). source_scale is lower than max_scale
+            when the zoomed frames have to be upscaled to stay under the ceiling.
+    """
+    width, height = size
+    frame_bytes = width * height * 3
+    # writer buffer, subtitle buffer and the frame being rendered
+    fixed = 3 * frame_bytes
+
+    ring_size = max(ring_size, min_ring_size)
+    while ring_size > min_ring_size:
+        source_bytes = frame_bytes * max_scale**2
+        if fixed + ring_size * frame_bytes + source_bytes <= memory_limit:
+            return ring_size, max_scale
+        ring_size -= 1
+
+    available = memory_limit - fixed - ring_size * frame_bytes
+    source_scale = max_scale
+    if available < frame_bytes * max_scale**2:
+        source_scale = max(1.0, (max(available, 0) / frame_bytes) ** 0.5)
+    if available < frame_bytes:
+        print(
+            f"memory limit of {memory_limit} bytes is too low for "
+            f"{width}x{height} frames, rendering anyway"
+        )
+    return ring_size, source_scale
+
+
+class FrameRing:
+    """
+    A fixed ring of frame buffers drained into an FFmpegPipeWriter by a thread.
+
+    Frames are rendered into free buffers while the writer thread pipes the
+    filled ones to ffmpeg, so rendering and encoding overlap without ever
+    holding more than the ring in memory.
+    """
+
+    def __init__(self, writer, size, ring_size=8):
+        """
+        Initializes the FrameRing class.
+
+        Args:
+            writer (FFmpegPipeWriter): An open writer.
+            size (tuple): Frame size as (width, height).
+            ring_size (int): Number of frame buffers (default: 8).
+        """
+        width, height = size
+        self.writer = writer
+        self.free = queue.Queue()
+        self.filled = queue.Queue()
+        for _ in range(ring_size):
+            self.free.put(np.empty((height, width, 3), dtype=np.uint8))
+        self.error = None
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+
+    def _drain(self):
+        """Writes filled buffers until the end marker, then returns."""
+        while True:
+            buffer = self.filled.get()
+            if buffer is None:
+                return
+            if self.error is None:
+                try:
+                    self.writer.write_frame(buffer)
+                except Exception as e:
+                    # keep recycling buffers so the producer never blocks
+                    self.error = e
+            self.free.put(buffer)
+
+    def start(self):
+        """Starts the writer thread."""
+        self.thread.start()
+        return self
+
+    def write(self, frame):
+        """
+        Copies a frame into a free buffer and queues it for writing.
+
+        Blocks while every buffer is waiting to be written.
+
+        Args:
+            frame (np.ndarray): The frame as a (height, width, 3) uint8 array.
+        """
+        if self.error is not None:
+            raise self.error
+        buffer = self.free.get()
+        np.copyto(buffer, frame)
+        self.filled.put(buffer)
+
+    def close(self):
+        """Waits for the queued frames to be written, re-raising writer errors."""
+        self.filled.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.filled.put(None)
+            self.thread.join()
+        return False
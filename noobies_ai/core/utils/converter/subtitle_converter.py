@@ -0,0 +1,256 @@
+from PIL import ImageColor
+from .font_manager import DEFAULT_FONT, STATIC_FONTS, FontManager
+from .subtitle_renderer import load_font
+import os
+
+
+def ass_color(color):
+    """Converts a color name or hex string to an ASS &HAABBGGRR color."""
+    red, green, blue = ImageColor.getrgb(color)[:3]
+    return f"&H00{blue:02X}{green:02X}{red:02X}"
+
+
+def ass_time(seconds):
+    """Formats seconds as an ASS timestamp (H:MM:SS.cc)."""
+    centiseconds = int(round(max(seconds, 0) * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    seconds, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
+
+
+def srt_time(seconds):
+    """Formats seconds as an SRT timestamp (HH:MM:SS,mmm)."""
+    milliseconds = int(round(max(seconds, 0) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+def subtitles_filter(subtitle_file, fonts_dir=STATIC_FONTS):
+    """
+    Returns the ffmpeg video filter burning a subtitle file.
+
+    Args:
+        subtitle_file (str): Path of the ASS or SRT file.
+        fonts_dir (str): Directory searched for the subtitle fonts (default: static/fonts).
+
+    Returns:
+        str: The filter, to be passed with -vf.
+    """
+
+    def quote(path):
+        return "'" + path.replace("\\", "/").replace("'", "'\\\\''") + "'"
+
+    return f"subtitles=filename={quote(subtitle_file)}:fontsdir={quote(fonts_dir)}"
+
+
+class SubtitleConverter:
+    """
+    Converts whisper word timestamps to ASS and SRT subtitle files.
+
+    Words are grouped into short lines. In the ASS output the line stays on
+    screen while it is spoken and the current word is highlighted.
+    """
+
+    def __init__(
+        self,
+        subtitle_options={},
+        size=(720, 1280),
+        max_words=4,
+        max_chars=24,
+        max_gap=0.6,
+    ):
+        """
+        Initializes the SubtitleConverter class.
+
+        Args:
+            subtitle_options (dict): Options for the subtitles (font, font_size, font_color,
+                base_color, stroke_width, stroke_color, positionY).
+            size (tuple): Video size as (width, height), used as the ASS script resolution.
+            max_words (int): Maximum number of words on a line (default: 4).
+            max_chars (int): Maximum number of characters on a line (default: 24).
+            max_gap (float): Silence in seconds that always starts a new line (default: 0.6).
+        """
+        self.subtitle_options = subtitle_options
+        self.width, self.height = size
+        self.max_words = max_words
+        self.max_chars = max_chars
+        self.max_gap = max_gap
+
+    def group_lines(self, words):
+        """
+        Groups words into subtitle lines.
+
+        Args:
+            words (list): Words as dicts with "word", "start" and "end" keys.
+
+        Returns:
+            list: Lines, each a list of words.
+        """
+        lines = []
+        line = []
+        for word in sorted(words, key=lambda word: word["start"]):
+            text = word["word"].strip()
+            if not text:
+                continue
+            word = dict(word, word=text)
+            if line:
+                length = sum(len(w["word"]) + 1 for w in line) + len(text)
+                if (
+                    len(line) >= self.max_words
+                    or length > self.max_chars
+                    or word["start"] - line[-1]["end"] > self.max_gap
+                    or line[-1]["word"][-1] in ".!?"
+                ):
+                    lines.append(line)
+                    line = []
+            line.append(word)
+        if line:
+            lines.append(line)
+        return lines
+
+    def _escape(self, text):
+        """Removes characters ASS would read as override tags."""
+        return text.replace("\\", "/").replace("{", "(").replace("}", ")")
+
+    def events(self, words):
+        """
+        Builds the ASS dialogue events, one per spoken word.
+
+        Args:
+            words (list): Words as dicts with "word", "start" and "end" keys.
+
+        Returns:
+            list: (start, end, text) tuples, text containing ASS override tags.
+        """
+        highlight = ass_color(self.subtitle_options.get("font_color") or "yellow")
+        events = []
+        for line in self.group_lines(words):
+            for i, word in enumerate(line):
+                end = line[i + 1]["start"] if i + 1 < len(line) else word["end"]
+                parts = []
+                for j, other in enumerate(line):
+                    text = self._escape(other["word"])
+                    if j == i:
+                        text = f"{{\\c{highlight}&}}{text}{{\\r}}"
+                    parts.append(text)
+                events.append((word["start"], max(end, word["start"]), " ".join(parts)))
+        return events
+
+    def fonts_dir(self):
+        """Returns the directory ffmpeg should search for the subtitle font."""
+        font = FontManager().resolve(self.subtitle_options.get("font"))
+        if font is not None:
+            return os.path.dirname(os.path.abspath(font))
+        return STATIC_FONTS
+
+    def filter(self, subtitle_file):
+        """Returns the ffmpeg video filter burning the given subtitle file."""
+        return subtitles_filter(subtitle_file, self.fonts_dir())
+
+    def font_name(self):
+        """Returns the family name of the subtitle font."""
+        font = load_font(self.subtitle_options.get("font") or DEFAULT_FONT, 10)
+        try:
+            return font.getname()[0]
+        except AttributeError:
+            return "Arial"
+
+    def to_ass(self, words, output_file, start=0.0, end=None):
+        """
+        Writes an ASS subtitle file.
+
+        Only the events between start and end are written, shifted so the
+        file starts at start. This is used to write one file per segment.
+
+        Args:
+            words (list): Words as dicts with "word", "start" and "end" keys.
+            output_file (str): Path of the ASS file.
+            start (float): Start of the written range in seconds (default: 0.0).
+            end (float): End of the written range in seconds, None for no limit (default: None).
+
+        Returns:
+            str: The path to the ASS file.
+        """
+        options = self.subtitle_options
+        scale = self.height / 1280
+        font_size = int(round((options.get("font_size") or 40) * scale))
+        stroke_width = (options.get("stroke_width") or 0) * scale
+        base_color = ass_color(options.get("base_color") or "white")
+        stroke_color = ass_color(options.get("stroke_color") or "black")
+        alignment = {"top": 8, "bottom": 2}.get(options.get("positionY"), 5)
+
+        lines = [
+            "[Script Info]",
+            "ScriptType: v4.00+",
+            f"PlayResX: {self.width}",
+            f"PlayResY: {self.height}",
+            "WrapStyle: 0",
+            "ScaledBorderAndShadow: yes",
+            "",
+            "[V4+ Styles]",
+            "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, "
+            "OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, "
+            "ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+            "Alignment, MarginL, MarginR, MarginV, Encoding",
+            f"Style: Default,{self.font_name()},{font_size},{base_color},"
+            f"{base_color},{stroke_color},&H00000000,0,0,0,0,100,100,0,0,1,"
+            f"{stroke_width:g},0,{alignment},20,20,{int(60 * scale)},1",
+            "",
+            "[Events]",
+            "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, "
+            "Effect, Text",
+        ]
+        for event_start, event_end, text in self.events(words):
+            if event_end <= start or (end is not None and event_start >= end):
+                continue
+            event_start = max(event_start, start) - start
+            event_end = (event_end if end is None else min(event_end, end)) - start
+            lines.append(
+                f"Dialogue: 0,{ass_time(event_start)},{ass_time(event_end)},"
+                f"Default,,0,0,0,,{text}"
+            )
+
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return output_file
+
+    def to_srt(self, words, output_file):
+        """
+        Writes an SRT subtitle file with one cue per line of words.
+
+        Args:
+            words (list): Words as dicts with "word", "start" and "end" keys.
+            output_file (str): Path of the SRT file.
+
+        Returns:
+            str: The path to the SRT file.
+        """
+        cues = []
+        for i, line in enumerate(self.group_lines(words)):
+            text = " ".join(word["word"] for word in line)
+            cues.append(
+                f"{i + 1}\n{srt_time(line[0]['start'])} --> "
+                f"{srt_time(line[-1]['end'])}\n{text}\n"
+            )
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(cues))
+        return output_file
+
+    def write(self, words, folder_path, name="subtitles"):
+        """
+        Writes both the ASS and the SRT sidecar files to a folder.
+
+        Args:
+            words (list): Words as dicts with "word", "start" and "end" keys.
+            folder_path (str): Destination folder.
+            name (str): Base name of the files (default: "subtitles").
+
+        Returns:
+            tuple: Paths of the ASS and the SRT file.
+        """
+        ass_file = self.to_ass(words, os.path.join(folder_path, name + ".ass"))
+        srt_file = self.to_srt(words, os.path.join(folder_path, name + ".srt"))
+        return ass_file, srt_file
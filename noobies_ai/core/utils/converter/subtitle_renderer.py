@@ -0,0 +1,154 @@
+from PIL import Image, ImageDraw, ImageFont
+from .font_manager import DEFAULT_FONT, FontManager
+from bisect import bisect_right
+import numpy as np
+
+
+def load_font(font, font_size):
+    """
+    Loads a TrueType font with Pillow.
+
+    Args:
+        font (str): Font path or name known to FontManager, None for the default font.
+        font_size (int): Font size in pixels.
+
+    Returns:
+        ImageFont.FreeTypeFont: The loaded font.
+    """
+    candidates = [FontManager().resolve(font), DEFAULT_FONT]
+    for candidate in candidates:
+        if candidate is None:
+            continue
+        try:
+            return ImageFont.truetype(candidate, font_size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+class SubtitleRenderer:
+    """
+    Burns word level subtitles into frames.
+
+    Every unique word is rasterized once with Pillow/FreeType into an RGBA
+    sprite, stored premultiplied, and alpha-blended into frames with NumPy.
+    """
+
+    def __init__(self, subtitles, subtitle_options, size, reference_height=1280):
+        """
+        Initializes the SubtitleRenderer class.
+
+        Args:
+            subtitles (list): Words as dicts with "word", "start" and "end" keys.
+            subtitle_options (dict): Options for the subtitles (font, font_size, font_color,
+                stroke_width, stroke_color, positionX, positionY).
+            size (tuple): Frame size as (width, height).
+            reference_height (int): Frame height font_size is given for, so drafts keep
+                the same proportions (default: 1280).
+        """
+        self.width, self.height = size
+        words = sorted(subtitles, key=lambda word: word["start"])
+        self.words = [word["word"].strip() for word in words]
+        self.starts = [word["start"] for word in words]
+        self.ends = [word["end"] for word in words]
+
+        scale = self.height / reference_height
+        font_size = max(1, int(round(subtitle_options.get("font_size", 40) * scale)))
+        self.font = load_font(subtitle_options.get("font"), font_size)
+        self.font_color = subtitle_options.get("font_color", "yellow")
+        self.stroke_width = int(round(subtitle_options.get("stroke_width", 0) * scale))
+        self.stroke_color = subtitle_options.get("stroke_color", "black")
+        self.position_x = subtitle_options.get("positionX", "center")
+        self.position_y = subtitle_options.get("positionY", "center")
+
+        self.sprites = {}
+        self.buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
+
+    def sprite(self, text):
+        """
+        Returns the cached sprite of a word, rasterizing it on first use.
+
+        Args:
+            text (str): The word.
+
+        Returns:
+            tuple: (x, y, premultiplied rgb, inverse alpha) with uint16 arrays, or None for blank text.
+        """
+        if text in self.sprites:
+            return self.sprites[text]
+
+        sprite = None
+        left, top, right, bottom = self.font.getbbox(
+            text, stroke_width=self.stroke_width
+        )
+        if text and right > left and bottom > top:
+            image = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+            ImageDraw.Draw(image).text(
+                (-left, -top),
+                text,
+                font=self.font,
+                fill=self.font_color,
+                stroke_width=self.stroke_width,
+                stroke_fill=self.stroke_color,
+            )
+            rgba = np.asarray(image).astype(np.uint16)
+            # never draw outside the frame
+            rgba = rgba[: self.height, : self.width]
+            alpha = rgba[..., 3:]
+            premultiplied = rgba[..., :3] * alpha
+            inverse_alpha = 255 - alpha
+            h, w = alpha.shape[:2]
+            x = self._place(self.position_x, w, self.width, "left", "right")
+            y = self._place(self.position_y, h, self.height, "top", "bottom")
+            sprite = (x, y, premultiplied, inverse_alpha)
+
+        self.sprites[text] = sprite
+        return sprite
+
+    def _place(self, position, length, total, start, end):
+        """Returns the offset of a sprite along one axis of the frame."""
+        if position == start:
+            offset = 0
+        elif position == end:
+            offset = total - length
+        elif position == "center":
+            offset = (total - length) // 2
+        else:
+            offset = int(position)
+        return min(max(offset, 0), total - length)
+
+    def word_at(self, t):
+        """Returns the word shown at time t, or None."""
+        index = bisect_right(self.starts, t) - 1
+        if index >= 0 and t < self.ends[index]:
+            return self.words[index]
+        return None
+
+    def apply(self, frame, t):
+        """
+        Draws the subtitle shown at time t on a frame.
+
+        The input frame is left untouched, the result is written into a
+        buffer owned by the renderer and is only valid until the next call.
+
+        Args:
+            frame (np.ndarray): The frame as a (height, width, 3) uint8 array.
+            t (float): Time of the frame in seconds.
+
+        Returns:
+            np.ndarray: The frame with the subtitle.
+        """
+        text = self.word_at(t)
+        if text is None:
+            return frame
+        sprite = self.sprite(text)
+        if sprite is None:
+            return frame
+
+        x, y, premultiplied, inverse_alpha = sprite
+        h, w = inverse_alpha.shape[:2]
+        np.copyto(self.buffer, frame)
+        region = self.buffer[y : y + h, x : x + w]
+        blended = region * inverse_alpha + premultiplied + 127
+        region[...] = blended // 255
+        return self.buffer
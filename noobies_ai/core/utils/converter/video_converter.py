@@ -1,33 +1,145 @@
 from moviepy.editor import *
-import numpy as np
+from imageio_ffmpeg import get_ffmpeg_exe
+from .ffmpeg_writer import FFmpegPipeWriter
+from .font_manager import FontManager
+from .image_converter import ImageConverter
+from .stream_renderer import FrameRing, RSSSampler, plan_memory
+from .segment_renderer import (
+    concat_segments,
+    frame_counts,
+    render_segment,
+    segment_subtitles,
+)
+from .subtitle_converter import SubtitleConverter
+from .subtitle_renderer import SubtitleRenderer
+from .zoom_engine import ZoomEngine, zoom_curve, zoom_scales
+from ..cache.disk_cache import DiskCache, default_cache_dir, hash_key
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
 import os
+import re
+import shutil
+
+# offsets of the script parts in voice.mp3, written by VideoGenerator.generate_audio
+PARTS_FILE = "parts.json"
+
+RENDER_PROFILES = {
+    "final": {
+        "width": 720,
+        "height": 1280,
+        "fps": 24,
+        "codec": "libx264",
+        "preset": "medium",
+        "threads": 8,
+    },
+    "draft": {
+        "width": 270,
+        "height": 480,
+        "fps": 12,
+        "codec": "libx264",
+        "preset": "ultrafast",
+        "threads": 8,
+    },
+}
 
 
 class VideoConverter:
-    def __init__(self):
+    backends = ["moviepy", "ffmpeg", "segments", "streaming"]
+    capabilities = None
+
+    def __init__(
+        self,
+        cache_dir=None,
+        cache_max_bytes=2 * 1024**3,
+        use_cache=True,
+        memory_limit=512 * 1024**2,
+        threads=None,
+    ):
+        """
+        Initializes the VideoConverter class.
+
+        Args:
+            cache_dir (str, optional): Directory of the rendered segment cache. Defaults to
+                the "segments" folder of the noobies_ai cache directory.
+            cache_max_bytes (int, optional): Size limit of the segment cache. Defaults to 2 GB.
+            use_cache (bool, optional): Whether the "segments" backend reuses cached segments.
+                Defaults to True.
+            memory_limit (int, optional): Ceiling in bytes for the frames and source image held
+                by the "streaming" backend. Defaults to 512 MB.
+            threads (int, optional): Encoder threads, overriding the render profile. Defaults to None.
+        """
         self.folder_path = None
+        self.zoom_base = 1.3
+        self.zoom_amplitude = 0.3
+        self.zoom_period = 3
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self.last_render_stats = None
+        self.segment_cache = None
+        if use_cache:
+            self.segment_cache = DiskCache(
+                cache_dir or default_cache_dir("segments"),
+                max_bytes=cache_max_bytes,
+                suffix=".mp4",
+            )
 
     def zoom_in_out(self, t):
         """Defines a zoom in and out function based on a sin wave"""
-        return 1.3 + 0.3 * np.sin(t / 3)
+        return zoom_curve(t, self.zoom_base, self.zoom_amplitude, self.zoom_period)
+
+    @classmethod
+    def check_capabilities(cls):
+        """
+        Checks once per process which external tools rendering can use.
+
+        The ImageMagick policy is only inspected, never rewritten. Text clips
+        need a policy that allows reading "@" files, which should be set up
+        when the image is built.
+
+        Returns:
+            dict: "ffmpeg", "imagemagick" and "imagemagick_text" flags.
+        """
+        if cls.capabilities is not None:
+            return cls.capabilities
+
+        capabilities = {}
+        try:
+            capabilities["ffmpeg"] = os.path.isfile(get_ffmpeg_exe())
+        except Exception:
+            capabilities["ffmpeg"] = False
+        capabilities["imagemagick"] = bool(
+            shutil.which("magick") or shutil.which("convert")
+        )
+        text_allowed = capabilities["imagemagick"]
+        for policy_file in [
+            "/etc/ImageMagick-6/policy.xml",
+            "/etc/ImageMagick-7/policy.xml",
+        ]:
+            try:
+                with open(policy_file, "r") as f:
+                    policy = f.read()
+            except OSError:
+                continue
+            if re.search(r'rights="none"\s+pattern="@\*"', policy):
+                text_allowed = False
+        capabilities["imagemagick_text"] = text_allowed
+
+        print("render capabilities:", capabilities)
+        cls.capabilities = capabilities
+        return capabilities
 
     def get_font_list(self):
         """Returns a list of fonts available on the system"""
-        font_list = TextClip.list("font")
-        return font_list
+        return FontManager().list_fonts()
 
     def create_text_clips(self, subtitles, subtitle_options):
-        # cat /etc/ImageMagick-6/policy.xml | sed 's/none/read,write/g'> /etc/ImageMagick-6/policy.xml
-        # we need to execute this command
-        # we will use subprocess module to execute this command
-        import subprocess
-
-        subprocess.call(
-            "cat /etc/ImageMagick-6/policy.xml | sed 's/none/read,write/g'> /etc/ImageMagick-6/policy.xml",
-            shell=True,
-        )
-
         """Creates a list of text clips from a list of subtitles"""
+        if not self.check_capabilities()["imagemagick_text"]:
+            raise RuntimeError(
+                "ImageMagick is missing or its policy blocks text rendering, "
+                "use SubtitleRenderer or subtitle_method='ass' instead"
+            )
         font_size = subtitle_options.get("font_size", 40)
         font_color = subtitle_options.get("font_color", "yellow")
         font = subtitle_options.get("font", "./static/fonts/Corben-Bold.ttf")
@@ -57,22 +169,115 @@ class VideoConverter:
 
         return clips
 
+    def part_durations(self, audio_duration, n_images):
+        """
+        Returns how long each image is shown.
+
+        When the voiceover was generated part by part, each image lasts as long
+        as its part. Otherwise the audio is split evenly.
+
+        Args:
+            audio_duration (float): Duration of the voiceover in seconds.
+            n_images (int): Number of images.
+
+        Returns:
+            list: Duration of each image in seconds.
+        """
+        parts_file = os.path.join(self.folder_path, PARTS_FILE)
+        try:
+            with open(parts_file, "r") as f:
+                offsets = json.load(f)
+        except (OSError, ValueError):
+            offsets = None
+        if offsets is None or len(offsets) != n_images:
+            if offsets is not None:
+                print(
+                    f"{len(offsets)} audio parts for {n_images} images, splitting evenly"
+                )
+            return [audio_duration / n_images] * n_images
+
+        # each image runs until the next part starts, the last one until the end
+        starts = [0.0] + [start for start, _ in offsets[1:]] + [audio_duration]
+        return [max(end - start, 0.0) for start, end in zip(starts[:-1], starts[1:])]
+
+    def prepare_images(self, image_files, counts, size, fps):
+        """
+        Decodes and fits all images concurrently, at the size the zoom engine needs.
+
+        Args:
+            image_files (list): Paths of the images, in order.
+            counts (list): Number of frames of each image.
+            size (tuple): Frame size as (width, height).
+            fps (int): Frames per second.
+
+        Returns:
+            list: One contiguous uint8 array per image.
+        """
+        sizes = [
+            ZoomEngine.source_size(
+                size, zoom_scales(count, fps, self.zoom_in_out).max()
+            )
+            for count in counts
+        ]
+        images, timings = ImageConverter().prepare_all(image_files, sizes)
+        print(f"prepared {len(images)} images in {sum(timings):.3f}s of work")
+        return images
+
     def create_video(
         self,
         folder_path,
         subtitles,
         subtitle_options={},
         output_file="video.mp4",
+        backend="moviepy",
+        profile="final",
+        subtitle_method="sprite",
     ):
-        """Creates a video from a folder of images and an audio file"""
+        """
+        Creates a video from a folder of images and an audio file.
+
+        Args:
+            folder_path (str): Folder containing the "images" folder and "voice.mp3".
+            subtitles (list): Word level subtitles burnt into the video, None for no subtitles.
+            subtitle_options (dict, optional): Options for the subtitles. Defaults to {}.
+            output_file (str, optional): Name of the video file written in folder_path. Defaults to "video.mp4".
+            backend (str, optional): "moviepy" to compose with moviepy, "ffmpeg" to pipe
+                raw frames straight into ffmpeg, "segments" to encode every image in
+                its own process and join them with stream copy or "streaming" to pipe
+                frames through a fixed ring of buffers under memory_limit. Defaults to "moviepy".
+            profile (str, optional): Name of the render profile in RENDER_PROFILES, "draft"
+                for a fast low resolution preview. Defaults to "final".
+            subtitle_method (str, optional): "sprite" to draw subtitles on the frames in Python or
+                "ass" to write subtitles.ass/subtitles.srt next to the video and burn the ASS file
+                with ffmpeg's subtitles filter. Defaults to "sprite".
+
+        Returns:
+            str: The path to the generated video file.
+        """
+        if backend not in self.backends:
+            raise ValueError(
+                f"Unknown render backend {backend}, expected one of {self.backends}"
+            )
+        if profile not in RENDER_PROFILES:
+            raise ValueError(
+                f"Unknown render profile {profile}, expected one of {list(RENDER_PROFILES)}"
+            )
+        profile = dict(RENDER_PROFILES[profile])
+        if self.threads is not None:
+            profile["threads"] = self.threads
         self.folder_path = folder_path
         image_folder = os.path.join(self.folder_path, "images")
+        # numeric order, so 10.png comes after 9.png
         image_files = sorted(
             [
                 os.path.join(image_folder, img)
                 for img in os.listdir(image_folder)
                 if img.endswith(".png")
-            ]
+            ],
+            key=lambda path: [
+                int(part) if part.isdigit() else part
+                for part in re.split(r"(\d+)", os.path.basename(path))
+            ],
         )
         audio_file = os.path.join(self.folder_path, "voice.mp3")
 
@@ -91,45 +296,378 @@ class VideoConverter:
             return
 
         # Calculate duration for each image
-        image_duration = audio_duration / len(image_files)
+        image_durations = self.part_durations(audio_duration, len(image_files))
 
-        clips = []
-        height = 1280
-        width = 720
-        # height = 480
-        # width = 270
-        # if width % 2 != 0:
-        #     width = width - 1
-        # width = int(width)
+        width = profile["width"]
+        height = profile["height"]
+        fps = profile["fps"]
         print(width, height)
-        for i in range(len(image_files)):
-            print("processing image", i)
-            clip = ImageClip(image_files[i]).set_duration(image_duration)
-            clip = clip.resize((width, height))
-            clip = clip.resize(self.zoom_in_out)
-            clips.append(clip)
+        output_path = os.path.join(self.folder_path, output_file)
 
-        print("concatenating")
-        video_clip = concatenate_videoclips(clips, method="compose")
-        video_clip = video_clip.set_audio(audio)
-        # final_video.write_videofile(output_file, fps=30, threads=8, audio=True, codec='libx264')
-
-        # print("adding subtitles")
-        # text_clips = self.create_text_clips(subtitles, subtitle_options)
-        # print("adding text clips")
-        # video_clip = CompositeVideoClip([video_clip] + text_clips)
-        print(video_clip.duration)
-        print("writing")
-        video_clip.write_videofile(
-            os.path.join(self.folder_path, output_file),
-            fps=24,
-            threads=8,
-            audio=True,
-            codec="libx264",
-            audio_codec="aac",
+        subtitle_converter = None
+        if subtitles and subtitle_method == "ass":
+            subtitle_converter = SubtitleConverter(subtitle_options, (width, height))
+            subtitle_file, _ = subtitle_converter.write(subtitles, self.folder_path)
+            print("subtitles written to", subtitle_file)
+
+        # samples the memory of this render only, the process may have rendered before
+        sampler = RSSSampler().start()
+        try:
+            counts = frame_counts(image_durations, fps)
+            if backend != "moviepy":
+                audio.close()
+                render = {
+                    "ffmpeg": self.render_ffmpeg,
+                    "segments": self.render_segments,
+                    "streaming": self.render_streaming,
+                }[backend]
+                render(
+                    image_files,
+                    counts,
+                    audio_file,
+                    output_path,
+                    profile,
+                    subtitles=subtitles,
+                    subtitle_options=subtitle_options,
+                    subtitle_converter=subtitle_converter,
+                )
+                self.report_memory(backend, sampler)
+                return output_path
+
+            clips = []
+            images = self.prepare_images(image_files, counts, (width, height), fps)
+            for i in range(len(image_files)):
+                print("processing image", i)
+                engine = ZoomEngine(
+                    images[i],
+                    size=(width, height),
+                    duration=counts[i] / fps,
+                    fps=fps,
+                    zoom=self.zoom_in_out,
+                )
+                clips.append(engine.to_clip())
+
+            print("concatenating")
+            video_clip = concatenate_videoclips(clips, method="chain")
+            video_clip = video_clip.set_audio(audio)
+
+            ffmpeg_params = None
+            if subtitle_converter is not None:
+                ffmpeg_params = ["-vf", subtitle_converter.filter(subtitle_file)]
+            elif subtitles:
+                print("adding subtitles")
+                renderer = SubtitleRenderer(
+                    subtitles, subtitle_options, (width, height)
+                )
+                video_clip = video_clip.fl(lambda gf, t: renderer.apply(gf(t), t))
+            print(video_clip.duration)
+            print("writing")
+            video_clip.write_videofile(
+                output_path,
+                fps=fps,
+                threads=profile["threads"],
+                audio=True,
+                codec=profile["codec"],
+                preset=profile["preset"],
+                audio_codec="aac",
+                ffmpeg_params=ffmpeg_params,
+            )
+            self.report_memory(backend, sampler)
+
+            return output_path
+        finally:
+            sampler.stop()
+
+    def report_memory(self, backend, sampler):
+        """
+        Prints the peak memory of the render and keeps it in last_render_stats.
+
+        Args:
+            backend (str): The backend that rendered the video.
+            sampler (RSSSampler): The sampler started before the render.
+
+        Returns:
+            dict: Peak RSS in bytes during the render of this process ("self") and of its
+                subprocesses, ffmpeg and the segment workers ("children").
+        """
+        stats = dict(sampler.stop(), backend=backend)
+        self.last_render_stats = stats
+        for name in ["self", "children"]:
+            if stats[name] is not None:
+                print(f"peak RSS ({name}): {stats[name] / 1024**2:.1f} MB")
+        return stats
+
+    def render_ffmpeg(
+        self,
+        image_files,
+        counts,
+        audio_file,
+        output_path,
+        profile,
+        subtitles=None,
+        subtitle_options={},
+        subtitle_converter=None,
+    ):
+        """
+        Renders the slideshow by piping raw frames into a single ffmpeg process.
+
+        Args:
+            image_files (list): Paths of the images, in order.
+            counts (list): Number of frames of each image.
+            audio_file (str): Path of the voiceover muxed into the video.
+            output_path (str): Path of the video file.
+            profile (dict): The render profile.
+            subtitles (list, optional): Word level subtitles. Defaults to None.
+            subtitle_options (dict, optional): Options for the subtitles. Defaults to {}.
+            subtitle_converter (SubtitleConverter, optional): Burns the subtitles as ASS with
+                ffmpeg instead of drawing them in Python when given. Defaults to None.
+        """
+        size = (profile["width"], profile["height"])
+        fps = profile["fps"]
+        renderer = None
+        ffmpeg_params = None
+        if subtitle_converter is not None:
+            subtitle_file = os.path.join(self.folder_path, "subtitles.ass")
+            ffmpeg_params = ["-vf", subtitle_converter.filter(subtitle_file)]
+        elif subtitles:
+            renderer = SubtitleRenderer(subtitles, subtitle_options, size)
+        writer = FFmpegPipeWriter(
+            output_path,
+            size,
+            fps=fps,
+            audio_file=audio_file,
+            codec=profile["codec"],
+            preset=profile["preset"],
+            threads=profile["threads"],
+            ffmpeg_params=ffmpeg_params,
         )
+        images = self.prepare_images(image_files, counts, size, fps)
+        with writer:
+            frame_index = 0
+            for i in range(len(image_files)):
+                print("processing image", i)
+                engine = ZoomEngine(
+                    images[i],
+                    size=size,
+                    duration=counts[i] / fps,
+                    fps=fps,
+                    zoom=self.zoom_in_out,
+                )
+                for frame in engine.frames():
+                    if renderer is not None:
+                        frame = renderer.apply(frame, frame_index / fps)
+                    writer.write_frame(frame)
+                    frame_index += 1
+        print("writing done")
+
+    def render_streaming(
+        self,
+        image_files,
+        counts,
+        audio_file,
+        output_path,
+        profile,
+        subtitles=None,
+        subtitle_options={},
+        subtitle_converter=None,
+        ring_size=8,
+    ):
+        """
+        Renders the slideshow with bounded memory, for small containers.
+
+        Only the source image of the current segment is held in memory, and
+        frames go through a fixed ring of buffers drained into ffmpeg by a
+        writer thread. The ring and the source scale are lowered as needed to
+        stay under memory_limit.
 
-        return os.path.join(self.folder_path, output_file)
+        Args:
+            image_files (list): Paths of the images, in order.
+            counts (list): Number of frames of each image.
+            audio_file (str): Path of the voiceover muxed into the video.
+            output_path (str): Path of the video file.
+            profile (dict): The render profile.
+            subtitles (list, optional): Word level subtitles. Defaults to None.
+            subtitle_options (dict, optional): Options for the subtitles. Defaults to {}.
+            subtitle_converter (SubtitleConverter, optional): Burns the subtitles as ASS with
+                ffmpeg instead of drawing them in Python when given. Defaults to None.
+            ring_size (int, optional): Wanted number of frame buffers. Defaults to 8.
+        """
+        size = (profile["width"], profile["height"])
+        fps = profile["fps"]
+        renderer = None
+        ffmpeg_params = None
+        if subtitle_converter is not None:
+            subtitle_file = os.path.join(self.folder_path, "subtitles.ass")
+            ffmpeg_params = ["-vf", subtitle_converter.filter(subtitle_file)]
+        elif subtitles:
+            renderer = SubtitleRenderer(subtitles, subtitle_options, size)
+
+        max_scale = max(
+            zoom_scales(count, fps, self.zoom_in_out).max() for count in counts
+        )
+        ring_size, source_scale = plan_memory(
+            size, max_scale, self.memory_limit, ring_size
+        )
+        print(
+            f"streaming with {ring_size} frame buffers, "
+            f"source scale {source_scale:.2f} of {max_scale:.2f}"
+        )
+        writer = FFmpegPipeWriter(
+            output_path,
+            size,
+            fps=fps,
+            audio_file=audio_file,
+            codec=profile["codec"],
+            preset=profile["preset"],
+            threads=profile["threads"],
+            ffmpeg_params=ffmpeg_params,
+        )
+        with writer, FrameRing(writer, size, ring_size) as ring:
+            frame_index = 0
+            for i, image_file in enumerate(image_files):
+                print("processing image", i)
+                scale = min(
+                    zoom_scales(counts[i], fps, self.zoom_in_out).max(), source_scale
+                )
+                engine = ZoomEngine(
+                    ImageConverter().prepare(
+                        image_file, ZoomEngine.source_size(size, scale)
+                    ),
+                    size=size,
+                    duration=counts[i] / fps,
+                    fps=fps,
+                    zoom=self.zoom_in_out,
+                    max_source_scale=source_scale,
+                )
+                for frame in engine.frames():
+                    if renderer is not None:
+                        frame = renderer.apply(frame, frame_index / fps)
+                    ring.write(frame)
+                    frame_index += 1
+                # drop the source before the next image is decoded
+                del engine
+        print("writing done")
+
+    def render_segments(
+        self,
+        image_files,
+        counts,
+        audio_file,
+        output_path,
+        profile,
+        subtitles=None,
+        subtitle_options={},
+        subtitle_converter=None,
+    ):
+        """
+        Encodes every image segment in its own worker process, then joins the
+        segments with stream copy and muxes the audio once.
+
+        Args:
+            image_files (list): Paths of the images, in order.
+            counts (list): Number of frames of each image.
+            audio_file (str): Path of the voiceover muxed into the video.
+            output_path (str): Path of the video file.
+            profile (dict): The render profile.
+            subtitles (list, optional): Word level subtitles. Defaults to None.
+            subtitle_options (dict, optional): Options for the subtitles. Defaults to {}.
+            subtitle_converter (SubtitleConverter, optional): Burns the subtitles as ASS with
+                ffmpeg instead of drawing them in Python when given. Defaults to None.
+        """
+        size = (profile["width"], profile["height"])
+        fps = profile["fps"]
+        encoder = {"codec": profile["codec"], "preset": profile["preset"]}
+        segment_folder = os.path.join(self.folder_path, "segments")
+        os.makedirs(segment_folder, exist_ok=True)
+        zoom_params = {
+            "base": self.zoom_base,
+            "amplitude": self.zoom_amplitude,
+            "period": self.zoom_period,
+        }
+
+        words = []
+        filters = []
+        subtitle_data = []
+        start_frame = 0
+        for i, count in enumerate(counts):
+            start = start_frame / fps
+            end = (start_frame + count) / fps
+            start_frame += count
+            if subtitle_converter is not None:
+                # one ASS file per segment, timed from the segment start
+                subtitle_file = subtitle_converter.to_ass(
+                    subtitles, os.path.join(segment_folder, f"{i}.ass"), start, end
+                )
+                with open(subtitle_file, "rb") as f:
+                    subtitle_data.append(f.read())
+                filters.append(subtitle_converter.filter(subtitle_file))
+                words.append([])
+            else:
+                words.append(segment_subtitles(subtitles, start, end))
+                subtitle_data.append([words[i], subtitle_options] if words[i] else None)
+                filters.append(None)
+
+        segment_files = [None] * len(image_files)
+        keys = [None] * len(image_files)
+        if self.segment_cache is not None:
+            for i, image_file in enumerate(image_files):
+                with open(image_file, "rb") as f:
+                    image_bytes = f.read()
+                keys[i] = hash_key(
+                    image_bytes,
+                    counts[i],
+                    fps,
+                    list(size),
+                    zoom_params,
+                    encoder,
+                    subtitle_data[i],
+                )
+                segment_files[i] = self.segment_cache.get(keys[i])
+        missing = [i for i, segment in enumerate(segment_files) if segment is None]
+        print(f"{len(image_files) - len(missing)} segments reused from cache")
+
+        if missing:
+            workers = max(1, min(os.cpu_count() or 1, len(missing)))
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            print(f"rendering {len(missing)} segments with {workers} workers")
+            # spawned, not forked: the server process holds gRPC channels and threads
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                futures = {
+                    i: executor.submit(
+                        render_segment,
+                        image_files[i],
+                        counts[i],
+                        os.path.join(segment_folder, f"{i}.mp4"),
+                        size,
+                        fps,
+                        zoom_params,
+                        encoder,
+                        threads,
+                        words[i],
+                        subtitle_options,
+                        filters[i],
+                    )
+                    for i in missing
+                }
+                for i, future in futures.items():
+                    segment_files[i] = future.result()
+                    if self.segment_cache is not None:
+                        segment_files[i] = self.segment_cache.put(
+                            keys[i], segment_files[i], move=True
+                        )
+
+        print("concatenating")
+        concat_segments(
+            segment_files,
+            audio_file,
+            output_path,
+            os.path.join(segment_folder, "segments.txt"),
+        )
+        if self.segment_cache is not None:
+            self.segment_cache.evict()
+        print("writing done")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,194 @@
+from moviepy.editor import VideoClip
+from PIL import Image
+import numpy as np
+import time
+
+
+def zoom_curve(t, base=1.3, amplitude=0.3, period=3):
+    """
+    Zoom factor of the Ken Burns effect at time t (scalar or array).
+
+    Args:
+        t (float or np.ndarray): Time in seconds, relative to the start of the segment.
+        base (float): Mean zoom factor (default: 1.3).
+        amplitude (float): Amplitude of the sin wave (default: 0.3).
+        period (float): Divisor applied to t inside the sin wave (default: 3).
+
+    Returns:
+        float or np.ndarray: The zoom factor(s).
+    """
+    return base + amplitude * np.sin(np.asarray(t) / period)
+
+
+def zoom_scales(n_frames, fps, zoom=zoom_curve):
+    """
+    Returns the zoom factor of every frame of a segment.
+
+    Factors are relative to the smallest one, so the frame is always fully
+    covered by the image.
+
+    Args:
+        n_frames (int): Number of frames of the segment.
+        fps (int): Frames per second.
+        zoom (callable): Vectorized function mapping time to a zoom factor (default: zoom_curve).
+
+    Returns:
+        np.ndarray: One factor per frame, all >= 1.
+    """
+    times = np.arange(n_frames) / fps
+    scales = np.broadcast_to(np.asarray(zoom(times), dtype=np.float64), times.shape)
+    return scales / scales.min()
+
+
+class ZoomEngine:
+    """
+    Renders a zoom (Ken Burns) segment from a single still image.
+
+    The source image is decoded and scaled once, so that the largest zoom of
+    the segment is a pure downscale. Images already prepared at source_size
+    (see ImageConverter.prepare) are used as they are. The crop window of every output frame is
+    precomputed for the whole segment with NumPy, and each frame is then
+    produced by a single crop-and-resize call inside Pillow.
+    """
+
+    def __init__(
+        self,
+        image,
+        size=(720, 1280),
+        duration=1.0,
+        fps=24,
+        zoom=zoom_curve,
+        resample=Image.BILINEAR,
+        max_source_scale=None,
+    ):
+        """
+        Initializes the ZoomEngine class.
+
+        Args:
+            image (str, PIL.Image.Image or np.ndarray): Source image path, image or uint8 RGB
+                array. Images of any other size than source_size are stretched to it.
+            size (tuple): Output frame size as (width, height) (default: (720, 1280)).
+            duration (float): Duration of the segment in seconds (default: 1.0).
+            fps (int): Frames per second of the segment (default: 24).
+            zoom (callable): Vectorized function mapping time to a zoom factor (default: zoom_curve).
+            resample (int): Pillow resampling filter used per frame (default: Image.BILINEAR).
+            max_source_scale (float): Caps the scale of the source image to bound its memory,
+                frames zoomed further are upscaled. None for no cap (default: None).
+        """
+        self.width, self.height = size
+        self.duration = duration
+        self.fps = fps
+        self.resample = resample
+        self.n_frames = max(1, int(round(duration * fps)))
+
+        scales = zoom_scales(self.n_frames, fps, zoom)
+        self.max_scale = float(scales.max())
+
+        source_scale = self.max_scale
+        if max_source_scale is not None:
+            source_scale = max(1.0, min(source_scale, max_source_scale))
+        source_size = self.source_size(size, source_scale)
+        self.source = self._load(image)
+        if self.source.size != source_size:
+            self.source = self.source.resize(source_size, Image.LANCZOS)
+
+        # crop windows in source coordinates, one row per frame
+        crop_w = source_size[0] / scales
+        crop_h = source_size[1] / scales
+        left = (source_size[0] - crop_w) / 2
+        top = (source_size[1] - crop_h) / 2
+        self.boxes = np.stack([left, top, left + crop_w, top + crop_h], axis=1)
+
+        self._last_index = None
+        self._last_frame = None
+
+    @staticmethod
+    def source_size(size, max_scale):
+        """
+        Returns the size the source image is scaled to.
+
+        Args:
+            size (tuple): Output frame size as (width, height).
+            max_scale (float): Largest relative zoom factor of the segment.
+
+        Returns:
+            tuple: The source size as (width, height).
+        """
+        return (int(round(size[0] * max_scale)), int(round(size[1] * max_scale)))
+
+    def _load(self, image):
+        """Returns the given image as an RGB Pillow image."""
+        if isinstance(image, Image.Image):
+            return image.convert("RGB")
+        if isinstance(image, np.ndarray):
+            return Image.fromarray(image).convert("RGB")
+        with Image.open(image) as im:
+            return im.convert("RGB")
+
+    def frame_index(self, t):
+        """Returns the index of the frame shown at time t."""
+        return min(max(int(t * self.fps), 0), self.n_frames - 1)
+
+    def frame(self, index):
+        """
+        Renders a single frame.
+
+        Args:
+            index (int): Index of the frame in the segment.
+
+        Returns:
+            np.ndarray: The frame as a (height, width, 3) uint8 array.
+        """
+        if index == self._last_index:
+            return self._last_frame
+        frame = self.source.resize(
+            (self.width, self.height),
+            self.resample,
+            box=tuple(self.boxes[index]),
+            reducing_gap=2.0,
+        )
+        self._last_index = index
+        self._last_frame = np.asarray(frame)
+        return self._last_frame
+
+    def frame_at(self, t):
+        """Renders the frame shown at time t (in seconds)."""
+        return self.frame(self.frame_index(t))
+
+    def frames(self):
+        """Yields every frame of the segment in order."""
+        for index in range(self.n_frames):
+            yield self.frame(index)
+
+    def to_clip(self):
+        """Returns the segment as a moviepy VideoClip."""
+        return VideoClip(make_frame=self.frame_at, duration=self.duration)
+
+
+if __name__ == "__main__":
+    import sys
+    from moviepy.editor import ImageClip
+
+    size = (720, 1280)
+    fps = 24
+    duration = 5
+    if len(sys.argv) > 1:
+        image = sys.argv[1]
+    else:
+        image = np.random.randint(0, 255, (1024, 1024, 3), dtype=np.uint8)
+
+    legacy = ImageClip(image).set_duration(duration)
+    legacy = legacy.resize(size).resize(zoom_curve)
+    start = time.perf_counter()
+    for i in range(duration * fps):
+        legacy.get_frame(i / fps)
+    legacy_fps = duration * fps / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    engine = ZoomEngine(image, size=size, duration=duration, fps=fps)
+    for frame in engine.frames():
+        pass
+    engine_fps = engine.n_frames / (time.perf_counter() - start)
+
+    print(f"moviepy resize: {legacy_fps:.1f} frames/s")
+    print(f"zoom engine:    {engine_fps:.1f} frames/s")
@@ -1,11 +1,22 @@
 import json
 from .utils.AI.imageAI import ImageAI
 from .utils.AI.textAI import TextAI
+from .utils.AI.json_stream import assemble
+from .utils.AI.output_parser import LANGUAGE_TOKEN_SCALE, OutputParser, token_budget
+from .utils.AI.prompt.text_prompt import REPAIR_JSON
 from .utils.AI.prompt.video_prompt import GENERATE_VIDEO_FROM_TOPIC
 from .utils.AI.syntax.video_syntax import SHORT_VIDEO_WITH_IMAGES
 from .utils.AI.audioAI import AudioAI
+from .utils.AI.script_aligner import ScriptAligner
 import os
-from .utils.converter.video_converter import VideoConverter
+from .utils.converter.video_converter import (
+    PARTS_FILE,
+    RENDER_PROFILES,
+    VideoConverter,
+)
+
+# output tokens of the spoken text per second of video
+SPOKEN_TOKENS_PER_SECOND = 4
 
 
 class VideoGenerator:
@@ -14,6 +25,7 @@ class VideoGenerator:
         model_id="gpt-4-turbo",
         prompt=GENERATE_VIDEO_FROM_TOPIC,
         syntax=SHORT_VIDEO_WITH_IMAGES,
+        use_cache=False,
     ):
         """
         Initializes the VideoGenerator class.
@@ -22,8 +34,10 @@ class VideoGenerator:
             model_id (str, optional): The ID of the language model to be used. Defaults to "gpt-4-turbo".
             prompt (str, optional): The prompt for generating the video script. Defaults to GENERATE_VIDEO_FROM_TOPIC.
             syntax (str, optional): The syntax for generating the video script. Defaults to SHORT_VIDEO_WITH_IMAGES.
+            use_cache (bool, optional): Whether identical script prompts reuse the cached response. Defaults to False.
         """
         self.model_id = model_id
+        self.use_cache = use_cache
         self.prompt = prompt
         self.syntax = syntax
         self.languages = ["en", "hi"]
@@ -37,6 +51,15 @@ class VideoGenerator:
         """
         return self.languages
 
+    def get_render_profiles(self):
+        """
+        Returns the available render profiles.
+
+        Returns:
+            list: List of render profile names, the final profile first.
+        """
+        return list(RENDER_PROFILES)
+
     def get_voice_ids(self):
         """
         Returns the available voice IDs.
@@ -47,6 +70,24 @@ class VideoGenerator:
         audio_ai = AudioAI()
         return audio_ai.get_voice_ids()
 
+    def check_capabilities(self):
+        """
+        Checks which external tools are available for rendering.
+
+        Returns:
+            dict: Capability flags, see VideoConverter.check_capabilities.
+        """
+        return VideoConverter.check_capabilities()
+
+    def warm_up(self):
+        """
+        Starts loading the transcription model in the background.
+
+        Returns:
+            threading.Thread: The loading thread, None if the model is loaded or loading.
+        """
+        return AudioAI.warm_up()
+
     def get_font_list(self):
         """
         Returns the available fonts.
@@ -65,6 +106,7 @@ class VideoGenerator:
         language="en",
         instructions="",
         num_of_images=5,
+        on_field=None,
     ):
         """
         Generates the video script.
@@ -76,17 +118,48 @@ class VideoGenerator:
             language (str, optional): The language of the video script. Defaults to "en".
             instructions (str, optional): Additional instructions for generating the script. Defaults to "".
             num_of_images (int, optional): The number of images to be included in the video. Defaults to 5.
+            on_field (callable, optional): When given, the script is streamed and on_field is called
+                with (path, value) for each field as soon as it is complete, e.g. (("video_title",), title)
+                or (("scripts", "part1"), {"text": ..., "image": ...}). Defaults to None.
 
         Returns:
             dict: The generated video script.
         """
         try:
             if self.model_id is None:
-                text_ai = TextAI()
+                text_ai = TextAI(use_cache=self.use_cache)
             else:
-                text_ai = TextAI(model_id=self.model_id)
+                text_ai = TextAI(model_id=self.model_id, use_cache=self.use_cache)
             print("Generating script...")
-            generated_script = text_ai.predict(
+            # a response cut off between two parts is still valid JSON once closed
+            parser = OutputParser(
+                self.syntax,
+                check=lambda data: (
+                    []
+                    if len(data["scripts"]) == num_of_images
+                    else [
+                        f"$.scripts has {len(data['scripts'])} parts, {num_of_images} are expected"
+                    ]
+                ),
+            )
+            try:
+                seconds = int(str(duration).rstrip("s"))
+            except ValueError:
+                seconds = 60
+            # the spoken text grows with the duration, the prompts with the images
+            max_tokens = token_budget(
+                self.syntax,
+                items=num_of_images,
+                extra=seconds * SPOKEN_TOKENS_PER_SECOND,
+                # other languages are assumed to cost about twice English
+                scale=LANGUAGE_TOKEN_SCALE.get(language, 2),
+            )
+            predict = text_ai.predict
+            if on_field is not None:
+                predict = lambda *args, **kwargs: assemble(
+                    text_ai.stream(*args, **kwargs), on_field
+                )
+            generated_script = predict(
                 self.prompt,
                 topic=topic,
                 duration=duration,
@@ -95,18 +168,23 @@ class VideoGenerator:
                 instructions=instructions,
                 num_of_images=num_of_images,
                 syntax=self.syntax,
+                max_tokens=max_tokens,
+                until=parser.complete,
+                cache_if=parser.accepts,
             )
             print(generated_script)
 
-            try:
-                generated_script = generated_script.replace("```json", "")
-                generated_script = generated_script.replace("```", "")
-            except Exception as e:
-                raise Exception(
-                    "Error occurred while removing json code block: " + str(e)
-                )
-
-            generated_script = json.loads(generated_script)
+            generated_script = parser.parse(
+                generated_script,
+                repair=lambda text, error: text_ai.predict(
+                    REPAIR_JSON,
+                    text=text,
+                    error=error,
+                    syntax=self.syntax,
+                    max_tokens=max_tokens,
+                    cache_if=parser.accepts,
+                ),
+            )
             video_title = generated_script["video_title"]
             video_description = generated_script["video_description"]
             video_script_json = json.dumps(generated_script["scripts"])
@@ -137,6 +215,7 @@ class VideoGenerator:
         output_file="audio.wav",
         language="en",
         voice_id=None,
+        parallel=False,
     ):
         """
         Generates the audio for the video.
@@ -146,6 +225,12 @@ class VideoGenerator:
             output_file (str, optional): The output file path for the audio. Defaults to "audio.wav".
             language (str, optional): The language of the audio. Defaults to "en".
             voice_id (str, optional): The voice ID for the audio. Defaults to None.
+            parallel (bool, optional): Whether to generate every part concurrently and join them.
+                The offsets of the parts are then written to parts.json next to the audio, so
+                every image is shown while its own part is spoken. Defaults to False.
+
+        Returns:
+            list: (start, end) offset in seconds of each part, None if not generated in parallel.
         """
         audio_ai = AudioAI()
         script = ". ".join(script_parts)
@@ -161,6 +246,23 @@ class VideoGenerator:
             "language": language,
         }
 
+        parts_file = os.path.join(os.path.dirname(output_file), PARTS_FILE)
+        if os.path.exists(parts_file):
+            os.remove(parts_file)
+
+        if parallel:
+            offsets = audio_ai.generate_parts(
+                script_parts,
+                inference_params=audio_options,
+                output_file=output_file,
+            )
+            if offsets is not None:
+                with open(parts_file, "w") as f:
+                    json.dump(offsets, f)
+                print(script)
+                return offsets
+            print("falling back to a single audio generation")
+
         audio_ai.generate(
             prompt=script,
             inference_params=audio_options,
@@ -169,52 +271,64 @@ class VideoGenerator:
 
         print(script)
 
-    def generate_images(self, image_prompts=[], image_path="images"):
+    def generate_images(
+        self, image_prompts=[], image_path="images", max_workers=4, timeout=120
+    ):
         """
-        Generates images based on the given prompts.
+        Generates images based on the given prompts, several at a time.
 
         Args:
             image_prompts (list, optional): List of image prompts. Defaults to [].
             image_path (str, optional): The path to save the generated images. Defaults to "images".
+            max_workers (int, optional): Number of images generated at the same time. Defaults to 4.
+            timeout (float, optional): Seconds after which an image request is given up. Defaults to 120.
 
         Returns:
-            list: List of paths to the generated images.
+            list: List of paths to the generated images, in prompt order.
         """
         try:
             image_ai = ImageAI()
-            image_paths = []
-            for i, prompt in enumerate(image_prompts):
-                path = os.path.join(image_path, f"{i}.png")
-                path = os.path.abspath(path)
-                try:
-                    image_ai.generate(
-                        prompt=prompt,
-                        inference_params={
-                            "quality": "standard",
-                            "size": "1024x1024",
-                        },
-                        output_file=path,
-                    )
-                    image_paths.append(path)
-                except Exception as e:
-                    print(f"Error generating image: {e}")
-                    continue
-            return image_paths
+            results = image_ai.generate_batch(
+                image_prompts,
+                image_path,
+                inference_params={
+                    "quality": "standard",
+                    "size": "1024x1024",
+                },
+                max_workers=max_workers,
+                timeout=timeout,
+            )
+            return [result["output_file"] for result in results if result["ok"]]
         except Exception as e:
             print(e)
             return None
 
-    def generate_subtiles(self, audio_path, word_timestamps=True):
+    def generate_subtiles(self, audio_path, word_timestamps=True, script=None):
         """
         Generates subtitles for the given audio.
 
+        When the narration text is known the words are aligned with the audio,
+        which is much cheaper than recognizing them. Speech recognition is only
+        used when the alignment is not confident enough.
+
         Args:
             audio_path (str): The path to the audio file.
             word_timestamps (bool, optional): Whether to include word timestamps in the subtitles. Defaults to True.
+            script (str, optional): The text spoken in the audio. Defaults to None.
 
         Returns:
             list: List of subtitle entries.
         """
+        if script:
+            aligner = ScriptAligner()
+            try:
+                subs, confidence = aligner.align(audio_path, script)
+                if confidence >= aligner.min_confidence:
+                    return subs
+                print(f"alignment confidence {confidence:.2f} is too low")
+            except Exception as e:
+                print(f"Error aligning script: {e}")
+            print("falling back to speech recognition")
         audio_ai = AudioAI()
         subs = audio_ai.get_transcription(audio_path, word_timestamps)
         print(subs)
@@ -229,6 +343,11 @@ class VideoGenerator:
             "font_size": 60,
             "font": "liberation-sans",
         },
+        backend="moviepy",
+        profile="final",
+        add_subtitles=False,
+        subtitle_method="sprite",
+        script_parts=None,
     ):
         """
         Generates the video.
@@ -237,6 +356,11 @@ class VideoGenerator:
             video_dir (str): The directory containing the video files.
             output_file (str, optional): The output file path for the video. Defaults to "video.mp4".
             subtitle_options (dict, optional): Options for the subtitles. Defaults to {"font_color": "yellow", "font_size": 60, "font": "liberation-sans"}.
+            backend (str, optional): Render backend, "moviepy", "ffmpeg", "segments" or "streaming" for bounded memory. Defaults to "moviepy".
+            profile (str, optional): Render profile, "final" or "draft" for a fast low resolution preview. Defaults to "final".
+            add_subtitles (bool, optional): Whether to transcribe the voiceover and burn word subtitles into the video. Defaults to False.
+            subtitle_method (str, optional): "sprite" to draw single words on the frames or "ass" to burn highlighted lines with ffmpeg and keep subtitles.ass/subtitles.srt sidecar files. Defaults to "sprite".
+            script_parts (list, optional): The script parts the voiceover was generated from, aligned with the audio instead of transcribing it. Defaults to None.
 
         Returns:
             str: The path to the generated video file.
@@ -244,10 +368,18 @@ class VideoGenerator:
         try:
             video_converter = VideoConverter()
             audio_path = os.path.join(video_dir, "voice.mp3")
-            # subtitles = self.generate_subtiles(audio_path)
             subtitles = None
+            if add_subtitles:
+                script = ". ".join(script_parts) if script_parts else None
+                subtitles = self.generate_subtiles(audio_path, script=script)
             video_path = video_converter.create_video(
-                video_dir, subtitles, subtitle_options=subtitle_options
+                video_dir,
+                subtitles,
+                subtitle_options=subtitle_options,
+                output_file=output_file,
+                backend=backend,
+                profile=profile,
+                subtitle_method=subtitle_method,
             )
 
             return video_path
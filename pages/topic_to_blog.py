@@ -92,6 +92,29 @@ def convert_to_dict(blog_metadata):
         st.error(f"Error converting blog metadata to dictionary: {e}")
 
 
+def blog_preview(container):
+    """
+    Returns a callback that shows the fields of the blog while it is streamed.
+
+    Parameters:
+        container: The Streamlit container to write into.
+
+    Returns:
+        callable: The on_field callback for BlogGenerator.generate_blog.
+    """
+
+    def on_field(path, value):
+        if path == ("title",):
+            container.markdown(f"# {value}")
+        elif path == ("description",):
+            container.markdown(f"*{value}*")
+        elif len(path) == 2 and path[0] == "content":
+            container.markdown(f"## {value['heading']}")
+            container.markdown(value["content"])
+
+    return on_field
+
+
 def generate_blog(blog_url, generate_ai_images, is_topic=False):
     """
     Generate a new blog based on the given URL.
@@ -112,13 +135,17 @@ def generate_blog(blog_url, generate_ai_images, is_topic=False):
         blog_generator = BlogGenerator()
         temp_dir_abs = os.path.abspath(temp_dir.name)
         st.session_state.temp_dir = temp_dir_abs
+        # shows the blog while it is written
+        preview = st.empty()
         blog_dir = blog_generator.generate_blog(
             url=blog_url,
             base_dir=temp_dir_abs,
             debug=True,
             generate_images=generate_ai_images,
             is_topic=is_topic,
+            on_field=blog_preview(preview.container()),
         )
+        preview.empty()
 
         st.markdown("## Generated Blog")
         with st.spinner("Loading your blog..."):
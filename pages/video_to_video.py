@@ -45,6 +45,28 @@ def init():
             st.session_state[variable] = None
 
 
+def script_preview(container):
+    """
+    Returns a callback that shows the fields of the script while it is streamed.
+
+    Parameters:
+        container: The Streamlit container to write into.
+
+    Returns:
+        callable: The on_field callback for VideoGenerator.generate_script.
+    """
+
+    def on_field(path, value):
+        if path == ("video_title",):
+            container.markdown(f"**Title 📌** {value}")
+        elif path == ("video_description",):
+            container.markdown(f"**Description 📝** {value}")
+        elif len(path) == 2 and path[0] == "scripts":
+            container.markdown(f"**{path[1]} ✏️** {value['text']}")
+
+    return on_field
+
+
 def generate_video():
     """
     Generates a video based on user inputs.
@@ -54,6 +76,8 @@ def generate_video():
     """
     try:
         video_generator = VideoGenerator()
+        if not video_generator.check_capabilities()["ffmpeg"]:
+            st.error("ffmpeg is not available, videos cannot be rendered")
         with st.form(key="generate_video_form"):
             col1, col2 = st.columns(2)
             with col1:
@@ -82,6 +106,8 @@ def generate_video():
                 submit_button = st.form_submit_button(label="Generate Script 🚀")
 
             if submit_button:
+                # shows the script while it is written
+                preview = st.empty()
                 with st.spinner("Generating Script"):
                     url = topic
                     transcript_downloader = YouTubeTranscriptDownloader()
@@ -102,7 +128,9 @@ def generate_video():
                         instructions=instructions,
                         language=language,
                         num_of_images=num_of_images,
+                        on_field=script_preview(preview.container()),
                     )
+                preview.empty()
                 if generated_script is None:
                     st.error("Error generating video")
 
@@ -140,16 +168,39 @@ def generate_video():
                     st.session_state.voice_option = video_generator.get_voice_ids()[
                         voice_option
                     ]
-                st.info("subtitle options are not available yet")
-                # font_color = st.color_picker("Font Color 🎨", value="#ffff00")
-                # font_list = video_generator.get_font_list()
-                # font = st.selectbox("Font 📝", font_list)
-                # font_size = st.slider(
-                #     "Font Size 🔍", min_value=1, max_value=120, value=70, step=10
-                # )
-                font_color = "#ffff00"
-                font = None
-                font_size = 70
+                with st.expander("Video Options 🎞️"):
+                    render_profile = st.selectbox(
+                        options=video_generator.get_render_profiles(),
+                        label="Render Profile 🎞️",
+                        help="draft renders a fast low resolution preview",
+                    )
+                with st.expander("Subtitle Options 💬"):
+                    add_subtitles = st.checkbox("Add Subtitles 💬", value=False)
+                    if add_subtitles:
+                        # load whisper only when subtitles may need it, while
+                        # the user sets up the rest of the video
+                        video_generator.warm_up()
+                    subtitle_styles = {
+                        "Highlighted lines": "ass",
+                        "Single words": "sprite",
+                    }
+                    subtitle_style = st.selectbox(
+                        "Subtitle Style ✨", list(subtitle_styles.keys())
+                    )
+                    font_color = st.color_picker("Font Color 🎨", value="#ffff00")
+                    font_list = video_generator.get_font_list()
+                    font = st.selectbox(
+                        "Font 📝",
+                        font_list,
+                        index=(
+                            font_list.index("Corben-Bold")
+                            if "Corben-Bold" in font_list
+                            else 0
+                        ),
+                    )
+                    font_size = st.slider(
+                        "Font Size 🔍", min_value=1, max_value=120, value=70, step=10
+                    )
 
             _, center, _ = st.columns([3, 2, 3])
             with center:
@@ -181,6 +232,7 @@ def generate_video():
                             output_file=audio_path,
                             voice_id=st.session_state.voice_option,
                             script_parts=updated_script_parts,
+                            parallel=True,
                         )
                         st.session_state.audio_path = audio_path
 
@@ -192,7 +244,10 @@ def generate_video():
                     st.audio(st.session_state.audio_path, format="audio/mp3")
 
                 with st.spinner("Generating images for your video"):
-                    st.info("Generating one image takes 20-30 seconds")
+                    st.info(
+                        "Images are requested in one batch when the model allows it, "
+                        "otherwise 4 at a time, each takes 20-30 seconds"
+                    )
                     try:
                         image_path = os.path.join(temp_dir.name, "images")
                         # mk folder if not exists
@@ -224,6 +279,11 @@ def generate_video():
                                     "font_size": font_size,
                                     "font": font,
                                 },
+                                backend="segments",
+                                profile=render_profile,
+                                add_subtitles=add_subtitles,
+                                script_parts=updated_script_parts,
+                                subtitle_method=subtitle_styles[subtitle_style],
                             )
                             st.session_state.video_path = video_path
                         except Exception as e:
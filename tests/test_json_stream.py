@@ -0,0 +1,90 @@
+import json
+
+from noobies_ai.core.utils.AI.json_stream import JSONStreamAssembler, assemble
+
+DOCUMENT = {
+    "title": 'A "quoted" title',
+    "count": 12,
+    "ok": True,
+    "content": [
+        {"heading": "H1", "content": "x, y ]}"},
+        {"heading": "H2", "content": "z"},
+    ],
+    "scripts": {"part1": {"text": "t1", "image": "i1"}},
+}
+
+
+def feed(text, size, **kwargs):
+    assembler = JSONStreamAssembler(**kwargs)
+    events = []
+    for i in range(0, len(text), size):
+        events += assembler.feed(text[i : i + size])
+    return assembler, events
+
+
+def test_fields_are_reported_as_they_close():
+    text = "```json\n" + json.dumps(DOCUMENT, indent=1) + "\n```"
+    for size in (1, 3, 64, len(text)):
+        assembler, events = feed(text, size)
+        paths = [path for path, _ in events]
+        assert paths == [
+            ("title",),
+            ("count",),
+            ("ok",),
+            ("content", 0),
+            ("content", 1),
+            ("content",),
+            ("scripts", "part1"),
+            ("scripts",),
+        ]
+        assert dict(events)[("content", 0)] == DOCUMENT["content"][0]
+        assert assembler.done
+        assert assembler.root == DOCUMENT
+
+
+def test_max_depth_zero_only_tracks_the_root():
+    assembler, events = feed(json.dumps(DOCUMENT) + " trailing text", 5, max_depth=0)
+    assert events == []
+    assert assembler.done
+    assert assembler.root == DOCUMENT
+
+
+def test_incomplete_document_is_not_done():
+    assembler, events = feed('{"title": "T", "content": [{"heading": "H', 4)
+    assert events == [(("title",), "T")]
+    assert not assembler.done
+
+
+def test_assemble_returns_the_whole_response():
+    fields = []
+    chunks = ["Here: ", '{"title"', ': "T"}', " bye"]
+    text = assemble(chunks, lambda path, value: fields.append((path, value)))
+    assert text == "".join(chunks)
+    assert fields == [(("title",), "T")]
+
+
+def test_trailing_comma_and_extra_bracket_do_not_raise():
+    assembler, events = feed('{"a": 1,}\nHope this helps :) }', 3)
+    assert assembler.done
+    assert assembler.root is None
+
+
+def test_extra_closing_bracket_stops_tracking():
+    assembler, events = feed('{"a": [1,2]]}', 1)
+    assert (("a",), [1, 2]) in events
+    assert assembler.done
+    assert assembler.root is None
+
+
+def test_bad_key_escape_stops_tracking():
+    assembler, events = feed('{"a\\x": 1, "b": 2}', 4)
+    assert events == []
+    assert assembler.done
+    assert assembler.root is None
+
+
+def test_text_after_a_bad_root_is_ignored():
+    assembler, events = feed('{"a": 1,} and more {"b": 2}', 2)
+    assert assembler.done
+    assert assembler.root is None
+    assert events == [(("a",), 1)]
@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+from noobies_ai.core.utils.AI.output_parser import (
+    OutputParser,
+    extract_json,
+    is_truncated,
+    repair_json,
+    token_budget,
+)
+from noobies_ai.core.utils.AI.syntax.video_syntax import SHORT_VIDEO_WITH_IMAGES
+
+
+def test_extract_json_drops_fences_and_trailing_text():
+    text = 'Sure!\n```json\n{"a": "}", "b": [1, 2]}\n```\nHope it helps {x}'
+    assert extract_json(text) == '{"a": "}", "b": [1, 2]}'
+
+
+def test_extract_json_keeps_unclosed_object():
+    assert extract_json('text {"a": [1, 2') == '{"a": [1, 2'
+
+
+def test_extract_json_without_object():
+    assert extract_json("no json here") is None
+
+
+def test_repair_json_missing_comma_before_key():
+    text = '{"a": {"text": "t" "image": "i2"}}'
+    assert json.loads(repair_json(text)) == {"a": {"text": "t", "image": "i2"}}
+
+
+def test_repair_json_missing_comma_between_objects():
+    text = '{"a": {"x": "1"} "b": {"x": "2"}}'
+    assert json.loads(repair_json(text)) == {"a": {"x": "1"}, "b": {"x": "2"}}
+
+
+def test_repair_json_unescaped_quotes():
+    text = '{"a": "he said "hi", then left", "b": "x"}'
+    assert json.loads(repair_json(text)) == {"a": 'he said "hi", then left', "b": "x"}
+
+
+def test_repair_json_trailing_commas():
+    text = '{"a": [1, 2,], "b": {"c": "d",},}'
+    assert json.loads(repair_json(text)) == {"a": [1, 2], "b": {"c": "d"}}
+
+
+def test_repair_json_control_characters_and_escapes():
+    text = '{"a": "line1\nline2\tC:\\path"}'
+    assert json.loads(repair_json(text)) == {"a": "line1\nline2\tC:\\path"}
+
+
+def test_repair_json_comments_and_python_literals():
+    text = '{"a": True, // comment\n "b": None, "c": False}'
+    assert json.loads(repair_json(text)) == {"a": True, "b": None, "c": False}
+
+
+def test_repair_json_truncated():
+    text = '{"a": "x", "b": [{"c": "cut off'
+    assert json.loads(repair_json(text)) == {"a": "x", "b": [{"c": "cut off"}]}
+
+
+def test_repair_json_stops_at_root():
+    assert json.loads(repair_json('{"a": 1} and more {"b": 2}')) == {"a": 1}
+
+
+def test_parser_validates_shape_and_asks_for_repair():
+    parser = OutputParser(SHORT_VIDEO_WITH_IMAGES)
+    valid = (
+        '{"video_title": "T", "video_description": "D",'
+        ' "scripts": {"part1": {"text": "a" "image": "b"}}}'
+    )
+    requests = []
+
+    def repair(text, error):
+        requests.append(error)
+        return valid
+
+    assert parser.parse(valid, repair=repair)["scripts"]["part1"]["image"] == "b"
+    assert requests == []
+    document = parser.parse('{"video_title": "T"}', repair=repair)
+    assert document["video_description"] == "D"
+    assert "$.video_description is missing" in requests[0]
+
+
+def test_parser_sends_truncated_response_to_repair():
+    parser = OutputParser(SHORT_VIDEO_WITH_IMAGES)
+    truncated = (
+        '{"video_title": "T", "video_description": "D",'
+        ' "scripts": {"part1": {"text": "a", "image": "b"}, "part2": {"text": "c"'
+    )
+    assert is_truncated(truncated)
+    assert parser.load(truncated)[0] is None
+    requests = []
+
+    def repair(text, error):
+        requests.append(error)
+        return truncated + ', "image": "d"}}}'
+
+    document = parser.parse(truncated, repair=repair)
+    assert "cut off" in requests[0]
+    assert document["scripts"]["part2"]["image"] == "d"
+
+
+def test_parser_check_rejects_missing_parts():
+    parser = OutputParser(
+        SHORT_VIDEO_WITH_IMAGES,
+        check=lambda data: (
+            [] if len(data["scripts"]) == 2 else ["$.scripts should have 2 parts"]
+        ),
+    )
+    one_part = (
+        '{"video_title": "T", "video_description": "D",'
+        ' "scripts": {"part1": {"text": "a", "image": "b"}}}'
+    )
+    assert not parser.complete(json.loads(one_part))
+    assert parser.load(one_part) == (None, "$.scripts should have 2 parts")
+    with pytest.raises(Exception):
+        parser.parse(one_part)
+
+
+def test_token_budget_scale_and_bounds():
+    english = token_budget(SHORT_VIDEO_WITH_IMAGES, items=5, extra=120)
+    hindi = token_budget(SHORT_VIDEO_WITH_IMAGES, items=5, extra=120, scale=3)
+    assert english == 1024
+    assert hindi > english
+    assert token_budget(SHORT_VIDEO_WITH_IMAGES, items=100, scale=3) == 4096
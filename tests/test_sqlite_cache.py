@@ -0,0 +1,41 @@
+import sqlite3
+
+from noobies_ai.core.utils.cache.sqlite_cache import SQLiteCache
+
+
+def counters(path):
+    db = sqlite3.connect(path)
+    try:
+        return dict(db.execute("SELECT name, value FROM counters").fetchall())
+    finally:
+        db.close()
+
+
+def test_get_only_reads_until_flush(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = SQLiteCache(path, flush_every=3)
+    cache.put("a", "1")
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert counters(path) == {}
+    cache.get("a")
+    assert counters(path) == {"hits": 2, "misses": 1}
+
+
+def test_stats_include_pending_lookups(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    cache.put("a", "1")
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_eviction_sees_pending_access_times(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None